@@ -0,0 +1,146 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from app.config import get_settings
+from app.metrics import STAGE_SECONDS
+
+
+class AdmissionRejected(Exception):
+    """An analysis was not admitted; maps to an HTTP status with Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded FIFO wait queue for analyses.
+
+    At most `max_concurrency` analyses run at once; up to `max_queue` more
+    wait for a slot, each for at most `queue_timeout` seconds. Beyond that,
+    requests are shed at once (429 when the queue is full, 503 when a queued
+    request times out or the server is draining) with a Retry-After
+    estimated from recent analysis durations, so an overload keeps a
+    steady number of analyses succeeding instead of all of them timing out.
+    """
+
+    def __init__(self, max_concurrency: int = 32, max_queue: int = 64, queue_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.draining = False
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long an analysis holds its slot
+        self._service_seconds = 1.0
+
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0, "draining": 0}
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have cleared (1 to 60)."""
+        backlog = (self.active + self.queued) / max(self.max_concurrency, 1)
+        return min(60, max(1, math.ceil(backlog * self._service_seconds)))
+
+    def _reject(self, status_code: int, reason: str, detail: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        return AdmissionRejected(status_code, reason, detail, self.retry_after())
+
+    async def acquire(self):
+        """Wait for a slot, or raise AdmissionRejected."""
+        if self.draining:
+            raise self._reject(503, "draining", "Server is shutting down")
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject(429, "queue_full", "Too many analyses in progress")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await waiter
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release(0.0)
+            waiter.cancel()
+            if isinstance(e, TimeoutError):
+                raise self._reject(503, "queue_timeout", "Timed out waiting for an analysis slot") from None
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="queue")
+        self.admitted += 1
+
+    def release(self, held_seconds: Optional[float] = None):
+        """Free a slot, handing it straight to the oldest waiter if there is one."""
+        if held_seconds:
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * held_seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot stays taken; the waiter now holds it
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Hold a slot for the enclosed block."""
+        await self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Stop admitting new analyses and wait for running and queued ones to
+        finish. Returns False if some were still running after `timeout`.
+        """
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while self.active or self.queued:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_admission_controller() -> AdmissionController:
+    """The process-wide admission controller for analyses, created on first use."""
+    settings = get_settings()
+    return AdmissionController(
+        max_concurrency=settings.analyze_max_concurrency,
+        max_queue=settings.analyze_max_queue,
+        queue_timeout=settings.analyze_queue_timeout_seconds
+    )
@@ -0,0 +1,83 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+from app.tokens import count_tokens_batch
+
+
+# Errors worth retrying: rate limits, upstream 5xx and network hiccups
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+
+def _retry_delay(error: Exception, attempt: int, base_delay: float, max_delay: float) -> float:
+    """Honour Retry-After when the API sends it, otherwise exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return min(base_delay * (2 ** attempt), max_delay) * (0.5 + random.random() / 2)
+
+
+async def embed_in_batches(
+    embeddings: Embeddings,
+    texts: List[str],
+    on_batch: Callable[[int, List[List[float]]], Awaitable[None]],
+    batch_size: int = 100,
+    max_concurrency: int = 4,
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> Dict[str, float]:
+    """
+    Embed `texts` in batches with several batches in flight at once.
+
+    Rate-limited and transient failures are retried with backoff. After
+    each batch is embedded, `on_batch(start, vectors)` is awaited with the
+    offset of the batch in `texts`, so callers can persist progress batch by
+    batch. Returns throughput stats for the run.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    retries = 0
+    started = time.perf_counter()
+
+    async def run_batch(start: int):
+        nonlocal retries
+        batch = texts[start:start + batch_size]
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                try:
+                    vectors = await embeddings.aembed_documents(batch)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if attempt == max_retries:
+                        raise
+                    retries += 1
+                    delay = _retry_delay(e, attempt, base_delay, max_delay)
+                    print(f"  ⚠ Batch at {start} failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+        await on_batch(start, vectors)
+
+    await asyncio.gather(*(run_batch(start) for start in range(0, len(texts), batch_size)))
+
+    elapsed = time.perf_counter() - started
+    tokens = count_tokens_batch(texts, encoding="cl100k_base") if texts else 0
+    return {
+        "documents": len(texts),
+        "tokens": tokens,
+        "seconds": elapsed,
+        "docs_per_sec": len(texts) / elapsed if elapsed else 0.0,
+        "tokens_per_sec": tokens / elapsed if elapsed else 0.0,
+        "retries": retries,
+    }
@@ -0,0 +1,109 @@
+import heapq
+import math
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.lexical_index import reciprocal_rank_fusion
+from app.tokens import count_tokens, split_tokens
+
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _sentences(text: str, max_tokens: int) -> List[Tuple[int, str, int]]:
+    """
+    (paragraph index, sentence, token count) for every sentence of `text`.
+
+    Sentences longer than `max_tokens` (e.g. unpunctuated text) are cut into
+    windows of at most `max_tokens` tokens.
+    """
+    sentences = []
+    for paragraph_index, paragraph in enumerate(PARAGRAPH_BREAK.split(text)):
+        for sentence in SENTENCE_END.split(paragraph.strip()):
+            sentence = " ".join(sentence.split())
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                sentences.append((paragraph_index, sentence, tokens))
+                continue
+            for piece in split_tokens(sentence, max_tokens):
+                sentences.append((paragraph_index, piece, count_tokens(piece)))
+    return sentences
+
+
+def _pack(sentences: List[Tuple[int, str, int]], chunk_tokens: int) -> List[str]:
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    paragraph = None
+    for paragraph_index, sentence, tokens in sentences:
+        # Prefer paragraph boundaries once a chunk is at least half full
+        boundary = paragraph_index != paragraph and current_tokens >= chunk_tokens // 2
+        if current and (boundary or current_tokens + tokens > chunk_tokens):
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+        paragraph = paragraph_index
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def split_story(text: str, chunk_tokens: int = 120, min_tokens: int = 200, max_chunks: int = 16) -> List[str]:
+    """
+    Split a long story into chunks of whole sentences, about `chunk_tokens` each.
+
+    Stories of at most `min_tokens` tokens are returned as a single chunk.
+    Chunks end at paragraph breaks where possible, and chunks grow as
+    needed so there are never more than `max_chunks` of them. A sentence
+    longer than a chunk is split mid-sentence.
+    """
+    total = count_tokens(text)
+    if total <= min_tokens:
+        return [text]
+    chunk_tokens = max(chunk_tokens, math.ceil(total / max_chunks))
+    sentences = _sentences(text, chunk_tokens)
+    chunks = _pack(sentences, chunk_tokens)
+    while len(chunks) > max_chunks:
+        chunk_tokens = math.ceil(chunk_tokens * 1.25)
+        chunks = _pack(sentences, chunk_tokens)
+    return chunks
+
+
+def aggregate_chunk_results(
+    results: List[List[Tuple[Document, float]]],
+    k: int,
+    method: str = "rrf",
+    rrf_k: int = 60
+) -> List[Document]:
+    """
+    Combine the (document, distance) results of each chunk of a story into one ranking.
+
+    "max" ranks each document by its best (smallest) distance to any chunk,
+    so a behavior described in a single paragraph still ranks high; "rrf"
+    fuses the chunk rankings with reciprocal-rank fusion, favoring
+    documents that match many chunks.
+    """
+    if method == "rrf":
+        return [doc for doc, _ in reciprocal_rank_fusion([[doc for doc, _ in rows] for rows in results], k=k, rrf_k=rrf_k)]
+
+    best: Dict[str, Tuple[Document, float]] = {}
+    for rows in results:
+        for doc, distance in rows:
+            key = doc.id or doc.page_content
+            if key not in best or distance < best[key][1]:
+                best[key] = (doc, distance)
+    return [doc for doc, _ in heapq.nsmallest(k, best.values(), key=lambda item: item[1])]
+
+
+def mean_embedding(embeddings: List[List[float]]) -> List[float]:
+    """Normalized mean of chunk embeddings: one vector standing for the whole story."""
+    mean = np.asarray(embeddings, dtype=np.float32).mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm else mean).tolist()
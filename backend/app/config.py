@@ -1,19 +1,119 @@
+import os
+from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
+
+# The backend directory, which relative data paths are resolved against
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
-    # OpenAI
-    openai_api_key: str
+    # OpenAI (only required by code paths that call OpenAI)
+    openai_api_key: str = ""
+    # Alternative OpenAI-compatible endpoint, e.g. scripts/stub_llm_server.py
+    openai_base_url: str = ""
+
+    # LLM: per-request deadline, hedging after a latency percentile, an optional
+    # fallback model, and a circuit breaker per model
+    llm_model: str = "gpt-4o"
+    llm_fallback_model: str = ""
+    llm_deadline_seconds: float = 60.0
+    llm_hedge_enabled: bool = True
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_min_delay_seconds: float = 2.0
+    llm_circuit_failure_threshold: int = 5
+    llm_circuit_reset_seconds: float = 30.0
 
     # Optional Notion Integration
     notion_api_key: str = ""
     notion_database_id: str = ""
 
+    # Embeddings: "openai" or "hashing" (deterministic, local, no model weights)
+    embedding_provider: str = "openai"
+    openai_embedding_model: str = "text-embedding-ada-002"
+    hashing_embedding_dimension: int = 1024
+
+    # Outbound HTTP: one shared keep-alive pool for the OpenAI chat and embedding
+    # models (HTTP/2 needs the h2 package)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 30.0
+    http2_enabled: bool = True
+    http_connect_timeout_seconds: float = 5.0
+    http_read_timeout_seconds: float = 60.0
+
     # Vector Database
     chroma_persist_directory: str = "./data/chroma_db"
+    # Search backend: "chroma" (HNSW), "numpy" (exact in-memory search over the Chroma data)
+    # or "mmap" (read-only exact search over the exported serving index, shared by all workers)
+    vector_backend: str = "chroma"
+
+    # Retrieval: "vector", "lexical" (BM25 only) or "hybrid" (reciprocal-rank fusion of both)
+    retrieval_mode: str = "hybrid"
+    retrieval_fetch_k: int = 20
+    rrf_k: int = 60
+    embedding_timeout_seconds: float = 10.0
+
+    # Long stories: stories over story_chunk_min_tokens are embedded as chunks of about
+    # story_chunk_tokens (at most story_max_chunks) whose results are combined by
+    # "max" (each document's best chunk match) or "rrf" (fusion of the chunk rankings)
+    story_chunk_min_tokens: int = 200
+    story_chunk_tokens: int = 120
+    story_max_chunks: int = 16
+    story_chunk_aggregation: str = "rrf"
+
+    # Query Embedding Cache
+    embedding_cache_size: int = 1024
+    embedding_cache_ttl_seconds: float = 86400.0
+    embedding_cache_persist: bool = True
+    # Rows kept in the on-disk tier (oldest are pruned beyond this)
+    embedding_cache_disk_max_rows: int = 100000
+
+    # Semantic Response Cache
+    response_cache_enabled: bool = True
+    response_cache_size: int = 256
+    response_cache_ttl_seconds: float = 3600.0
+    response_cache_similarity_threshold: float = 0.97
+
+    # Prompt token budget (template + story + retrieved context)
+    prompt_token_budget: int = 4000
+
+    # Ingestion (batched document embedding)
+    ingest_batch_size: int = 100
+    ingest_max_concurrency: int = 4
+    ingest_max_retries: int = 6
+
+    # Admission control for /analyze and /analyze/stream: analyses running at
+    # once, how many may wait for a slot and for how long, and how long
+    # shutdown waits for them to finish
+    analyze_max_concurrency: int = 32
+    analyze_max_queue: int = 64
+    analyze_queue_timeout_seconds: float = 10.0
+    shutdown_drain_seconds: float = 30.0
+
+    # Multi-turn sessions (/analyze with a session_id), persisted to the
+    # backend's own SQLite file (relative to backend/; empty keeps them in
+    # memory only); idle sessions are evicted after the TTL
+    session_db_path: str = "data/sessions.sqlite3"
+    session_max_sessions: int = 1000
+    session_idle_ttl_seconds: float = 86400.0
+    session_max_turns: int = 50
+    session_max_documents: int = 10
+    session_summary_token_budget: int = 800
+
+    # Batch Analysis
+    batch_max_stories: int = 1000
+    batch_max_concurrency: int = 8
+
+    # Request profiling: wall-clock profiles of selected requests, written as
+    # <request id>.folded flame-graph stacks (off unless one of the first two is set)
+    profile_header_enabled: bool = False
+    profile_sample_rate: float = 0.0
+    profile_paths: str = "/analyze"
+    profile_directory: str = "./data/profiles"
+    profile_interval_ms: float = 5.0
 
     # API Configuration
     api_host: str = "0.0.0.0"
@@ -27,10 +127,33 @@ class Settings(BaseSettings):
         """Convert comma-separated CORS origins to list."""
         return [origin.strip() for origin in self.cors_origins.split(",")]
 
+    @property
+    def session_db_file(self) -> Optional[str]:
+        """Absolute path of the session database, or None to keep sessions in memory."""
+        if not self.session_db_path:
+            return None
+        return os.path.join(BACKEND_DIR, self.session_db_path)
+
     class Config:
         env_file = ".env"
         case_sensitive = False
 
 
-# Global settings instance
-settings = Settings()
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """The process-wide settings, read from the environment on first use."""
+    return Settings()
+
+
+def require_openai_api_key(settings: Settings) -> str:
+    """The OpenAI API key, or a clear error if it is not configured."""
+    if not settings.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY is not set (see backend/.env.example)")
+    return settings.openai_api_key
+
+
+def __getattr__(name: str):
+    # `from app.config import settings` keeps working, but reads the environment lazily
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
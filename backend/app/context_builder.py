@@ -0,0 +1,119 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from app.tokens import count_tokens
+
+
+# List-valued sections of a document whose items are deduplicated across documents
+DEDUPE_SECTIONS = {
+    "Red Flags",
+    "Manipulation Techniques",
+    "Consistent Behaviors",
+    "Behaviors They Avoid",
+    "Trauma Signs in Victims",
+    "Common Traits",
+}
+SEPARATOR = "---"
+
+
+class ContextBlock:
+    """
+    Context rendering of one document, prepared once and reused for every prompt.
+
+    Each line of the document's content is kept in order; lines from the
+    sections in DEDUPE_SECTIONS are split into items so duplicates can be
+    dropped at query time.
+    """
+
+    def __init__(self, doc: Document):
+        self.lines: List[Tuple[Optional[str], List[str], str]] = []
+        for line in doc.page_content.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            label, _, value = line.partition(": ")
+            if label in DEDUPE_SECTIONS and value:
+                self.lines.append((label, [item.strip() for item in value.split(", ") if item.strip()], line))
+            else:
+                self.lines.append((None, [], line))
+
+        self.text = "\n".join([line for _, _, line in self.lines] + [SEPARATOR])
+        self.tokens = count_tokens(self.text)
+        # Header (name + description) used when the full block does not fit
+        self.core_text = "\n".join([line for _, _, line in self.lines[:2]] + [SEPARATOR])
+        self.core_tokens = count_tokens(self.core_text)
+
+    def render(self, seen: Set[str]) -> Tuple[str, int]:
+        """Render without items already in `seen`, adding the kept items to `seen`."""
+        changed = False
+        rendered = []
+        for label, items, line in self.lines:
+            if label is None:
+                rendered.append(line)
+                continue
+            kept = [item for item in items if item.lower() not in seen]
+            seen.update(item.lower() for item in kept)
+            if len(kept) != len(items):
+                changed = True
+            if kept:
+                rendered.append(f"{label}: {', '.join(kept)}")
+
+        if not changed:
+            return self.text, self.tokens
+        text = "\n".join(rendered + [SEPARATOR])
+        return text, count_tokens(text)
+
+
+def _block_key(doc: Document) -> str:
+    if doc.id:
+        return f"{doc.id}:{doc.metadata.get('content_hash', '')}"
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class ContextBuilder:
+    """
+    Packs retrieved documents into a token budget for the prompt.
+
+    Blocks for every document in the collection are rendered and measured
+    up front; documents not seen before (e.g. ingested after load) are
+    rendered on first use. Blocks are packed in retrieval order, dropping
+    red flags, techniques and behaviors already present in an earlier block.
+    A block that does not fit is reduced to its name and description, or
+    skipped, so the context never exceeds the budget.
+    """
+
+    def __init__(self, documents: Iterable[Document] = ()):
+        self.blocks: Dict[str, ContextBlock] = {}
+        for doc in documents:
+            self.block(doc)
+
+    def block(self, doc: Document) -> ContextBlock:
+        key = _block_key(doc)
+        block = self.blocks.get(key)
+        if block is None:
+            block = self.blocks[key] = ContextBlock(doc)
+        return block
+
+    def build(self, docs: List[Document], token_budget: int) -> Tuple[str, int]:
+        """Return the context string for `docs` and its token count, within `token_budget`."""
+        parts = []
+        used = 0
+        seen: Set[str] = set()
+
+        for doc in docs:
+            block = self.block(doc)
+            # Render against a copy so a skipped block doesn't mark its items as seen
+            candidate_seen = set(seen)
+            text, tokens = block.render(candidate_seen)
+            if used + tokens + 1 > token_budget:
+                text, tokens = block.core_text, block.core_tokens
+                candidate_seen = seen
+                if used + tokens + 1 > token_budget:
+                    continue
+            parts.append(text)
+            used += tokens + 1  # +1 for the joining newline
+            seen = candidate_seen
+
+        return "\n".join(parts), used
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.single_flight import SingleFlight, normalize_text
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Query-embedding cache wrapped around another Embeddings implementation.
+
+    Query vectors, keyed by model and whitespace-normalized query, are kept
+    in an in-process LRU with size and TTL limits and, optionally, in a
+    SQLite file on disk so they survive restarts; the disk tier expires rows
+    after the same TTL and keeps at most `max_disk_rows`. On the async
+    paths, disk reads and writes run in a worker thread. Concurrent async
+    misses for the same query, single or batched, share one provider call.
+    Document embeddings (ingestion) pass straight through to the wrapped provider.
+    """
+
+    # Minimum seconds between prunes of the disk tier
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_size: int = 1024,
+        ttl_seconds: float = 86400.0,
+        persist_path: Optional[str] = None,
+        max_disk_rows: int = 100000,
+    ):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.max_disk_rows = max_disk_rows
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes use of the SQLite connection, which worker threads share
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_prune = 0.0
+        self._inflight = SingleFlight("query_embedding")
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the on-disk store on first use."""
+        if self.persist_path is None:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_created_at ON query_embeddings (created_at)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _lookup_memory(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Unexpired vectors for `keys` held in memory."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                vector, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                else:
+                    del self._memory[key]
+        return found
+
+    def _lookup_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Unexpired vectors for `keys` on disk, copied into memory. Blocking."""
+        if self.persist_path is None or not keys:
+            return {}
+        now = time.time()
+        with self._db_lock:
+            rows = self._connect().execute(
+                f"SELECT key, vector, created_at FROM query_embeddings "
+                f"WHERE key IN ({', '.join('?' * len(keys))}) AND created_at >= ?",
+                (*keys, now - self.ttl_seconds)
+            ).fetchall()
+        found = {key: (array("d", blob).tolist(), created_at) for key, blob, created_at in rows}
+        with self._lock:
+            for key, (vector, created_at) in found.items():
+                self._remember(key, vector, created_at)
+            self.disk_hits += len(found)
+        return {key: vector for key, (vector, _) in found.items()}
+
+    def _count(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Cached vectors for the distinct `keys`, from memory then disk. Blocking."""
+        keys = list(dict.fromkeys(keys))
+        found = self._lookup_memory(keys)
+        found.update(self._lookup_disk([key for key in keys if key not in found]))
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    async def _aget_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Async version of _get_many: disk reads run in a worker thread."""
+        keys = list(dict.fromkeys(keys))
+        found = self._lookup_memory(keys)
+        missing = [key for key in keys if key not in found]
+        if missing and self.persist_path is not None:
+            found.update(await asyncio.to_thread(self._lookup_disk, missing))
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def _remember(self, key: str, vector: List[float], created_at: float):
+        """Insert into the LRU, evicting the least recently used entries. Caller holds the lock."""
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _put_many(self, items: List[tuple]) -> float:
+        """Cache (key, vector) pairs in memory. Returns their creation time."""
+        created_at = time.time()
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector, created_at)
+        return created_at
+
+    def _write_disk(self, items: List[tuple], created_at: float):
+        """Write (key, vector) pairs to disk in one transaction, pruning now and then. Blocking."""
+        if self.persist_path is None:
+            return
+        with self._db_lock:
+            db = self._connect()
+            db.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                [(key, array("d", vector).tobytes(), created_at) for key, vector in items]
+            )
+            db.commit()
+        if time.time() - self._last_prune > self.PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired rows, then the oldest rows beyond `max_disk_rows`. Returns how many were deleted."""
+        if self.persist_path is None:
+            return 0
+        now = time.time()
+        with self._db_lock:
+            self._last_prune = now
+            db = self._connect()
+            removed = db.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+            removed += db.execute(
+                "DELETE FROM query_embeddings WHERE key IN ("
+                "SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_rows,)
+            ).rowcount
+            db.commit()
+        return removed
+
+    def _put(self, key: str, vector: List[float]):
+        items = [(key, vector)]
+        self._write_disk(items, self._put_many(items))
+
+    async def _aput_many(self, items: List[tuple]):
+        """Cache (key, vector) pairs, writing them to disk in a worker thread."""
+        created_at = self._put_many(items)
+        if self.persist_path is not None:
+            await asyncio.to_thread(self._write_disk, items, created_at)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, serving repeated queries from the cache."""
+        key = self._key(text)
+        vector = self._get_many([key]).get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async version of embed_query."""
+        key = self._key(text)
+        vector = (await self._aget_many([key])).get(key)
+        if vector is None:
+            vector, _ = await self._inflight.do(key, lambda: self._aembed_miss(key, text))
+        return vector
+
+    async def _aembed_miss(self, key: str, text: str) -> List[float]:
+        vector = await self.embeddings.aembed_query(text)
+        await self._aput_many([(key, vector)])
+        return vector
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many queries, sending every cache miss in one batched request.
+
+        Misses already being embedded by a concurrent call (single or batch)
+        wait for that call instead of being embedded again.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = await self._aget_many(keys)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            embedded = await self._inflight.do_many(
+                missing, lambda batch: self._aembed_misses([text_by_key[key] for key in batch], batch)
+            )
+            vectors.update(zip(missing, embedded))
+
+        return [vectors[key] for key in keys]
+
+    async def _aembed_misses(self, texts: List[str], keys: List[str]) -> List[List[float]]:
+        vectors = await self.embeddings.aembed_documents(texts)
+        await self._aput_many(list(zip(keys, vectors)))
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents without caching."""
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async version of embed_documents."""
+        return await self.embeddings.aembed_documents(texts)
+
+    def clear(self):
+        """Drop every cached query embedding, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+        if self.persist_path is not None:
+            with self._db_lock:
+                db = self._connect()
+                db.execute("DELETE FROM query_embeddings")
+                db.commit()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._memory),
+        }
@@ -0,0 +1,90 @@
+import hashlib
+import math
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import Settings, get_settings, require_openai_api_key
+from app.lexical_index import tokenize
+
+
+# Output dimension of the OpenAI embedding models, used to validate existing collections
+OPENAI_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings: signed feature hashing of word, word-pair
+    and character-trigram features with sublinear term frequency, L2-normalised.
+
+    Needs no model weights and no network, so queries are embedded in
+    microseconds on the CPU. Quality is lexical rather than semantic.
+    """
+
+    def __init__(self, dimension: int = 1024):
+        self.dimension = dimension
+        self.model = f"hashing-{dimension}"
+
+    def _features(self, text: str) -> Counter:
+        terms = tokenize(text)
+        features = Counter(terms)
+        for term in terms:
+            if " " in term or len(term) < 4:
+                continue
+            padded = f"<{term}>"
+            # Character trigrams weigh less than whole words
+            for i in range(len(padded) - 2):
+                features[f"#{padded[i:i + 3]}"] += 0.25
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for feature, count in self._features(text).items():
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            weight = 1.0 + math.log(count) if count >= 1 else count
+            vector[(value >> 1) % self.dimension] += sign * weight
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def create_embeddings(provider: str, settings: Optional[Settings] = None) -> Embeddings:
+    """Build the embedding provider named in settings ("openai" or "hashing")."""
+    settings = settings or get_settings()
+    if provider == "openai":
+        # Imported here: the OpenAI client is slow to import and unused by local providers
+        from langchain_openai import OpenAIEmbeddings
+        from app.http_clients import get_http_clients
+        http_clients = get_http_clients()
+        return OpenAIEmbeddings(
+            model=settings.openai_embedding_model,
+            openai_api_key=require_openai_api_key(settings),
+            base_url=settings.openai_base_url or None,
+            http_client=http_clients.client,
+            http_async_client=http_clients.async_client,
+            timeout=http_clients.timeout
+        )
+    if provider == "hashing":
+        return HashingEmbeddings(dimension=settings.hashing_embedding_dimension)
+    raise ValueError(f"Unknown embedding provider: {provider!r} (expected 'openai' or 'hashing')")
+
+
+def embedding_signature(provider: str, embeddings: Embeddings) -> Tuple[str, Optional[int]]:
+    """Provider identity and vector dimension (None if unknown) recorded on each collection."""
+    model = getattr(embeddings, "model", type(embeddings).__name__)
+    dimension = getattr(embeddings, "dimension", None) or getattr(embeddings, "dimensions", None)
+    if dimension is None:
+        dimension = OPENAI_DIMENSIONS.get(model)
+    return f"{provider}:{model}", dimension
@@ -0,0 +1,247 @@
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.models import Finding
+from app.vector_store import document_name
+
+
+# Severity cues, strongest first. Cues match as word prefixes ("abuse" also matches "abusive").
+SEVERITY_CUES = {
+    "danger": [
+        "dangerous", "danger", "serious", "urgent", "abuse", "abusive", "unsafe",
+        "violence", "violent", "threat", "emergency", "coercive", "physical harm",
+    ],
+    "warning": [
+        "concerning", "concern", "warning", "red flag", "manipulat", "controlling",
+        "unhealthy", "gaslight", "toxic", "worrying", "troubling",
+    ],
+}
+SEVERITY_RANK = {"info": 0, "warning": 1, "danger": 2}
+
+# A period after these does not end a sentence ("Dr. Jekyll/Mr. Hyde")
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "jr", "sr", "e.g", "i.e", "etc"}
+
+# How findings are titled and described, per document category
+CATEGORY_LABELS = {
+    "player_typology": ("Pattern Detected", "This behavior pattern matches known manipulation tactics."),
+    "abuse_flavor": ("Abuse Flavor", "This behavior matches a known flavor of abuse."),
+    "trauma": ("Trauma Sign", "This is a recognised sign of trauma in people targeted by manipulation."),
+    "vulnerability": ("Vulnerability", "This vulnerability is commonly targeted by manipulators."),
+}
+DEFAULT_LABEL = ("Pattern Detected", "This behavior pattern matches known manipulation tactics.")
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton: finds every keyword occurrence in one pass over the text."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, Any]]] = [[]]
+        self.max_length = 0
+
+    def add(self, keyword: str, payload: Any):
+        """Add a keyword; `payload` is reported with every match."""
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(keyword), payload))
+        self.max_length = max(self.max_length, len(keyword))
+
+    def build(self) -> "AhoCorasick":
+        """Compute failure links; call once after every keyword is added."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+        return self
+
+    def step(self, state: int, ch: str) -> int:
+        while state and ch not in self._goto[state]:
+            state = self._fail[state]
+        return self._goto[state].get(ch, 0)
+
+    def outputs(self, state: int) -> List[Tuple[int, Any]]:
+        return self._outputs[state]
+
+
+def _normalize(keyword: str) -> str:
+    """Lowercase and strip emoji/punctuation from the ends of a keyword."""
+    return re.sub(r"^[^\w]+|[^\w.]+$", "", keyword.strip().lower())
+
+
+def _keyword_variants(name: str, aliases: Iterable[str] = ()) -> List[str]:
+    """The full name, its aliases, and the parts of combined names like "Dr. Jekyll/Mr. Hyde"."""
+    variants = [name, *aliases]
+    for value in list(variants):
+        parts = [part for part in re.split(r"[,/]", value) if part.strip()]
+        if len(parts) > 1:
+            variants.extend(parts)
+    seen = []
+    for variant in variants:
+        keyword = _normalize(variant)
+        if len(keyword) >= 3 and keyword not in seen:
+            seen.append(keyword)
+    return seen
+
+
+class FindingsExtractor:
+    """
+    Extracts findings from LLM responses against the whole pattern vocabulary.
+
+    Built once from the collection metadata: every pattern name, alias,
+    abuse flavor, trauma sign and vulnerability type, plus the severity cues,
+    go into a single Aho-Corasick automaton. A response is scanned in one
+    linear pass; each mention takes the severity of the strongest cue in its
+    sentence.
+    """
+
+    def __init__(self, metadatas: Iterable[dict]):
+        self.automaton = AhoCorasick()
+        self.entries: Dict[str, Tuple[str, str]] = {}
+
+        for metadata in metadatas:
+            metadata = metadata or {}
+            name = document_name(metadata)
+            if name == "Unknown" or name in self.entries:
+                continue
+            self.entries[name] = (metadata.get("category", "unknown"), name)
+            aliases = [metadata["alias"]] if metadata.get("alias") else []
+            for keyword in _keyword_variants(name, aliases):
+                self.automaton.add(keyword, ("pattern", name, True))
+
+        for severity, cues in SEVERITY_CUES.items():
+            for cue in cues:
+                self.automaton.add(cue, ("severity", severity, False))
+
+        self.automaton.build()
+
+    def scanner(self) -> "FindingsScanner":
+        """Start an incremental scan, e.g. over streamed tokens."""
+        return FindingsScanner(self)
+
+    def extract(self, text: str) -> List[Finding]:
+        """Extract findings from a complete response."""
+        scanner = self.scanner()
+        scanner.feed(text)
+        return scanner.finish()
+
+    def make_finding(self, name: str, severity: str) -> Finding:
+        category, _ = self.entries[name]
+        title, description = CATEGORY_LABELS.get(category, DEFAULT_LABEL)
+        return Finding(
+            type=severity,
+            title=f"{title}: {name}",
+            description=description,
+            matched_pattern=name
+        )
+
+
+class FindingsScanner:
+    """
+    Incremental state of one scan. Text can be fed in arbitrary chunks.
+
+    Matches are only accepted on word boundaries, which needs one character of
+    lookahead, so a match that ends a chunk is confirmed by the next chunk (or
+    by finish()).
+    """
+
+    def __init__(self, extractor: FindingsExtractor):
+        self.extractor = extractor
+        self.state = 0
+        self.history = deque(maxlen=extractor.automaton.max_length + 1)
+        self.previous = " "
+        self.word = ""
+        self.last_word = ""
+        self.pending: List[Tuple[str, Any]] = []
+
+        self.sentence_patterns: List[str] = []
+        self.sentence_severity = "info"
+        self.severities: Dict[str, str] = {}
+
+    def _boundary_before(self, length: int) -> bool:
+        """Whether the character before a match of `length` ending at the last character is a non-word char."""
+        if len(self.history) <= length:
+            return True
+        return not self.history[-length - 1].isalnum()
+
+    def _accept(self, kind: str, value: str):
+        if kind == "severity":
+            if SEVERITY_RANK[value] > SEVERITY_RANK[self.sentence_severity]:
+                self.sentence_severity = value
+        elif value not in self.sentence_patterns:
+            self.sentence_patterns.append(value)
+
+    def _close_sentence(self) -> List[Finding]:
+        """Assign the sentence severity to every pattern mentioned in it."""
+        new_findings = []
+        for name in self.sentence_patterns:
+            previous = self.severities.get(name)
+            if previous is None:
+                new_findings.append(name)
+            if previous is None or SEVERITY_RANK[self.sentence_severity] > SEVERITY_RANK[previous]:
+                self.severities[name] = self.sentence_severity
+        self.sentence_patterns = []
+        self.sentence_severity = "info"
+        return [self.extractor.make_finding(name, self.severities[name]) for name in new_findings]
+
+    def feed(self, text: str) -> List[Finding]:
+        """Scan more text. Returns findings for patterns first seen in sentences completed by this chunk."""
+        automaton = self.extractor.automaton
+        new_findings = []
+
+        for ch in text.lower():
+            is_word = ch.isalnum()
+
+            # Confirm matches that ended on the previous character
+            if self.pending:
+                if not is_word:
+                    for kind, value in self.pending:
+                        self._accept(kind, value)
+                self.pending = []
+
+            if is_word or ch == ".":
+                self.word += ch
+            elif self.word:
+                self.last_word, self.word = self.word, ""
+
+            ends_sentence = ch.isspace() and self.previous in ".!?" and not (
+                self.previous == "." and self.last_word.rstrip(".") in ABBREVIATIONS
+            )
+            if ch == "\n" or ends_sentence:
+                new_findings.extend(self._close_sentence())
+
+            self.history.append(ch)
+            self.state = automaton.step(self.state, ch)
+            for length, (kind, value, whole_word) in automaton.outputs(self.state):
+                if not self._boundary_before(length):
+                    continue
+                if whole_word:
+                    self.pending.append((kind, value))
+                else:
+                    self._accept(kind, value)
+            self.previous = ch
+
+        return new_findings
+
+    def finish(self) -> List[Finding]:
+        """End the scan and return every finding, in order of first mention."""
+        for kind, value in self.pending:
+            self._accept(kind, value)
+        self.pending = []
+        self._close_sentence()
+        return [self.extractor.make_finding(name, severity) for name, severity in self.severities.items()]
@@ -0,0 +1,211 @@
+import importlib.util
+import logging
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+
+import httpx
+
+from app.config import Settings, get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Release:
+    """Calls `release` once, however many times it is invoked."""
+
+    def __init__(self, release: Callable[[], None]):
+        self._release = release
+
+    def __call__(self):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+
+class _CountedStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release: _Release):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.release()
+
+
+class _AsyncCountedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: _Release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self.release()
+
+
+class _PoolUsage:
+    """Outbound requests in flight on one client: sent, and their response not yet closed."""
+
+    def __init__(self, max_connections: int, multiplexed: bool = False):
+        self.max_connections = max_connections
+        self.multiplexed = multiplexed
+        self.in_flight = 0
+
+    def start(self) -> _Release:
+        self.in_flight += 1
+        return _Release(self._finish)
+
+    def _finish(self):
+        self.in_flight -= 1
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            # Each in-flight HTTP/1.1 request holds a connection; past the limit they queue
+            "waiting": 0 if self.multiplexed else max(0, self.in_flight - self.max_connections),
+            "max_connections": self.max_connections,
+        }
+
+
+class _CountingTransport(httpx.BaseTransport):
+    """Transport wrapper counting requests in flight, through public transport APIs only."""
+
+    def __init__(self, transport: httpx.BaseTransport, usage: _PoolUsage):
+        self.transport = transport
+        self.usage = usage
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        release = self.usage.start()
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        if response.is_closed:
+            # Already read in full (e.g. a mocked response): nothing left to hold a connection
+            release()
+            return response
+        response.stream = _CountedStream(response.stream, release)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class _AsyncCountingTransport(httpx.AsyncBaseTransport):
+    """Async version of _CountingTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, usage: _PoolUsage):
+        self.transport = transport
+        self.usage = usage
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        release = self.usage.start()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        if response.is_closed:
+            # Already read in full (e.g. a mocked response): nothing left to hold a connection
+            release()
+            return response
+        response.stream = _AsyncCountedStream(response.stream, release)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class HTTPClients:
+    """
+    Shared outbound HTTP clients for the OpenAI chat and embedding models.
+
+    One keep-alive connection pool per process (one for sync calls, one
+    for async calls) with limits, timeouts and HTTP/2 from settings, so
+    connections and TLS sessions are reused across every model instead of
+    each OpenAI client opening its own. The clients are created on first use
+    (or by `open()` at startup) and closed by `aclose()` at shutdown.
+
+    Models hold on to the clients they were built with, so `generation`
+    changes whenever the clients are closed: a model built at an older
+    generation holds closed clients and must be rebuilt.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds
+        )
+        self.timeout = httpx.Timeout(
+            settings.http_read_timeout_seconds,
+            connect=settings.http_connect_timeout_seconds
+        )
+        self.http2 = settings.http2_enabled
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP2_ENABLED is set but the h2 package is not installed; using HTTP/1.1")
+            self.http2 = False
+
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._usage = _PoolUsage(self.limits.max_connections, multiplexed=self.http2)
+        self._async_usage = _PoolUsage(self.limits.max_connections, multiplexed=self.http2)
+        self.generation = 0
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            transport = httpx.HTTPTransport(limits=self.limits, http2=self.http2)
+            self._client = httpx.Client(transport=_CountingTransport(transport, self._usage), timeout=self.timeout)
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            self._async_client = httpx.AsyncClient(
+                transport=_AsyncCountingTransport(transport, self._async_usage), timeout=self.timeout
+            )
+        return self._async_client
+
+    def open(self):
+        """Create both clients up front (connections are still opened on demand)."""
+        self.client
+        self.async_client
+
+    async def aclose(self):
+        """Close both clients and their pooled connections; models built on them must be rebuilt."""
+        if self._async_client is None and self._client is None:
+            return
+        self.generation += 1
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Requests in flight on the sync and async clients."""
+        return {"sync": self._usage.stats, "async": self._async_usage.stats}
+
+
+@lru_cache(maxsize=None)
+def get_http_clients() -> HTTPClients:
+    """The process-wide HTTP clients, created on first use."""
+    return HTTPClients()
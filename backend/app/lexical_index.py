@@ -0,0 +1,196 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have",
+    "he", "her", "him", "his", "i", "if", "in", "is", "it", "its", "me", "my", "of", "on",
+    "or", "she", "so", "that", "the", "their", "them", "they", "this", "to", "was", "we",
+    "were", "with", "you", "your",
+}
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Files of a BM25 index exported for memory-mapping (see BM25Index.save_arrays)
+TERMS = "bm25_terms.json"
+POSTING_OFFSETS = "bm25_offsets.npy"
+POSTINGS = "bm25_postings.npy"
+LENGTHS = "bm25_lengths.npy"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms for BM25: unigrams without stopwords, plus every adjacent
+    word pair so literal phrases ("silent treatment") score as a unit.
+    """
+    words = _WORD.findall(text.lower())
+    terms = [word for word in words if word not in STOPWORDS]
+    terms.extend(
+        f"{first} {second}" for first, second in zip(words, words[1:])
+        if not (first in STOPWORDS and second in STOPWORDS)
+    )
+    return terms
+
+
+class MappedPostings(Mapping[str, List[Tuple[int, int]]]):
+    """
+    BM25 postings stored as (document, term frequency) rows of a memory-mapped array.
+
+    Only the term-to-row lookup is held in process memory; a term's
+    postings are read from the shared pages when it is queried.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, postings: np.ndarray):
+        self.rows = {term: row for row, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+
+    def __getitem__(self, term: str) -> List[Tuple[int, int]]:
+        row = self.rows[term]
+        return [tuple(entry) for entry in self.postings[self.offsets[row]:self.offsets[row + 1]].tolist()]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.rows)
+
+    def document_frequencies(self) -> Dict[str, int]:
+        counts = np.diff(self.offsets).tolist()
+        return {term: counts[row] for term, row in self.rows.items()}
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring."""
+
+    def __init__(self, documents: Sequence[Document], version: Optional[str] = None,
+                 postings: Optional[Mapping[str, List[Tuple[int, int]]]] = None,
+                 lengths: Optional[Sequence[int]] = None,
+                 k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.version = version
+        self.k1 = k1
+        self.b = b
+
+        if postings is None or lengths is None:
+            postings, lengths = {}, []
+            for i, doc in enumerate(documents):
+                terms = tokenize(doc.page_content)
+                lengths.append(len(terms))
+                for term, tf in Counter(terms).items():
+                    postings.setdefault(term, []).append((i, tf))
+        self.postings = postings
+        self.lengths = lengths
+
+        self.average_length = float(np.mean(self.lengths)) if len(self.lengths) else 0.0
+        n = len(documents)
+        frequencies = (
+            self.postings.document_frequencies() if isinstance(self.postings, MappedPostings)
+            else {term: len(entries) for term, entries in self.postings.items()}
+        )
+        self.idf = {
+            term: math.log(1 + (n - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in frequencies.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Top-k documents by BM25 score (higher is better); documents sharing no term are omitted."""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.average_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[i], score) for i, score in top]
+
+    def save(self, path: str):
+        """Persist the index (documents included) as JSON."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "version": self.version,
+            "documents": [
+                {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+                for doc in self.documents
+            ],
+            "lengths": self.lengths,
+            "postings": self.postings,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Load a persisted index, or None if there is none."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        documents = [Document(**doc) for doc in payload["documents"]]
+        postings = {term: [tuple(entry) for entry in entries] for term, entries in payload["postings"].items()}
+        return cls(documents, version=payload.get("version"), postings=postings, lengths=payload["lengths"])
+
+    def save_arrays(self, directory: str):
+        """
+        Persist the postings and document lengths as flat arrays for load_arrays.
+
+        Documents are not included: they are served from the same export
+        (see app/serving_index.py).
+        """
+        terms = list(self.postings)
+        offsets = [0]
+        rows: List[Tuple[int, int]] = []
+        for term in terms:
+            rows.extend(self.postings[term])
+            offsets.append(len(rows))
+        np.save(os.path.join(directory, POSTING_OFFSETS), np.asarray(offsets, dtype=np.int64))
+        np.save(os.path.join(directory, POSTINGS), np.asarray(rows, dtype=np.int32).reshape(-1, 2))
+        np.save(os.path.join(directory, LENGTHS), np.asarray(self.lengths, dtype=np.int32))
+        with open(os.path.join(directory, TERMS), 'w', encoding='utf-8') as f:
+            json.dump(terms, f, ensure_ascii=False)
+
+    @classmethod
+    def load_arrays(cls, directory: str, documents: Sequence[Document], version: Optional[str] = None) -> Optional["BM25Index"]:
+        """Memory-map an index written by save_arrays over `documents`, or None if there is none."""
+        try:
+            with open(os.path.join(directory, TERMS), 'r', encoding='utf-8') as f:
+                terms = json.load(f)
+        except FileNotFoundError:
+            return None
+        # Empty arrays cannot be memory-mapped
+        mmap_mode = "r" if terms else None
+        offsets = np.load(os.path.join(directory, POSTING_OFFSETS), mmap_mode=mmap_mode)
+        postings = np.load(os.path.join(directory, POSTINGS), mmap_mode=mmap_mode)
+        lengths = np.load(os.path.join(directory, LENGTHS), mmap_mode=mmap_mode)
+        return cls(documents, version=version, postings=MappedPostings(terms, offsets, postings), lengths=lengths)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Tuple[Document, float]]:
+    """Fuse several rankings: each document scores sum(1 / (rrf_k + rank)) over the rankings it appears in."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            key = doc.id or doc.page_content
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+
+    top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return [(documents[key], score) for key, score in top]
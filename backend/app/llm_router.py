@@ -0,0 +1,254 @@
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+
+from app.metrics import LLM_ATTEMPTS, LLM_CIRCUIT_OPEN, LLM_HEDGES
+
+
+class LLMUnavailableError(RuntimeError):
+    """No LLM route could answer: every circuit is open, or every attempt failed or ran out of time."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and the
+    route is skipped. Once `reset_seconds` have passed, a single probe
+    request is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now (without claiming the half-open probe)."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def begin(self):
+        if self.state == "half_open":
+            self._probing = True
+
+    def cancel(self):
+        """An attempt was abandoned (e.g. it lost a hedge) without an outcome."""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LLMRoute:
+    """A chat model with its own circuit breaker and recent latencies."""
+
+    def __init__(self, name: str, model: BaseChatModel, breaker: CircuitBreaker, window: int = 200):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        # Successful latencies per call kind: full response ("invoke") or first chunk ("stream")
+        self.latencies = {"invoke": deque(maxlen=window), "stream": deque(maxlen=window)}
+
+
+class LLMRouter:
+    """
+    Sends each LLM request with a deadline, hedging and failover across routes.
+
+    The first route whose circuit allows it gets the request. If it has not
+    answered after the hedge delay (the `hedge_percentile` of its recent
+    latencies, at least `hedge_min_delay` seconds), or fails sooner, the
+    next route (the fallback model, or the same model again when there is
+    none) is sent the same request and whichever answers first wins; the
+    other is cancelled. Every attempt is bounded by the request deadline.
+    For streams the race is on the first chunk.
+    """
+
+    def __init__(
+        self,
+        routes: List[LLMRoute],
+        deadline_seconds: float = 60.0,
+        hedge_enabled: bool = True,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 2.0,
+        hedge_min_samples: int = 20
+    ):
+        self.routes = routes
+        self.deadline_seconds = deadline_seconds
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+
+    def hedge_delay(self, route: LLMRoute, kind: str) -> float:
+        """Seconds to wait for `route` before hedging; the minimum until enough latencies are known."""
+        latencies = route.latencies[kind]
+        if len(latencies) < self.hedge_min_samples:
+            return self.hedge_min_delay
+        return max(self.hedge_min_delay, float(np.percentile(latencies, self.hedge_percentile)))
+
+    def _plan(self) -> List[LLMRoute]:
+        """Routes to try, in order: the first available route, then its backup (hedge or failover)."""
+        available = [route for route in self.routes if route.breaker.allow()]
+        if not available:
+            raise LLMUnavailableError(
+                "Every LLM circuit is open: " + ", ".join(route.name for route in self.routes)
+            )
+        primary = available[0]
+        # Back up with the next available route, or the same one if it is the only one
+        backup = available[1] if len(available) > 1 else primary
+        return [primary, backup]
+
+    def _record_failure(self, route: LLMRoute, error: Exception):
+        route.breaker.record_failure()
+        LLM_CIRCUIT_OPEN.set(int(route.breaker.opened_at is not None), route=route.name)
+        LLM_ATTEMPTS.inc(route=route.name, outcome="timeout" if isinstance(error, TimeoutError) else "error")
+
+    async def _attempt(self, route: LLMRoute, kind: str, call: Callable[[BaseChatModel], Awaitable], deadline: float):
+        route.breaker.begin()
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout_at(deadline):
+                result = await call(route.model)
+        except asyncio.CancelledError:
+            route.breaker.cancel()
+            LLM_ATTEMPTS.inc(route=route.name, outcome="cancelled")
+            raise
+        except Exception as e:
+            self._record_failure(route, e)
+            raise
+        route.breaker.record_success()
+        LLM_CIRCUIT_OPEN.set(0, route=route.name)
+        LLM_ATTEMPTS.inc(route=route.name, outcome="success")
+        route.latencies[kind].append(time.perf_counter() - started)
+        return route, result
+
+    async def _race(
+        self,
+        kind: str,
+        call: Callable[[BaseChatModel], Awaitable],
+        deadline: float
+    ) -> Tuple[LLMRoute, object, List[asyncio.Task]]:
+        """
+        Run `call` on the planned routes with hedging and failover; returns the
+        winning route, its result and any attempts that also succeeded but lost.
+        """
+        loop = asyncio.get_running_loop()
+        plan = self._plan()
+        first = plan.pop(0)
+        # Without hedging, the backup is only used if the first attempt fails
+        hedge_at = loop.time() + self.hedge_delay(first, kind) if self.hedge_enabled else float("inf")
+        pending = {asyncio.create_task(self._attempt(first, kind, call, deadline))}
+        errors: List[BaseException] = []
+
+        try:
+            while pending:
+                timeout = max(0.0, hedge_at - loop.time()) if plan and hedge_at != float("inf") else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                errors.extend(task.exception() for task in done if task.exception() is not None)
+                if winners:
+                    route, result = winners[0].result()
+                    return route, result, winners[1:]
+
+                # Hedge when the delay has passed, or fail over at once if everything in flight failed
+                if plan and (not pending or loop.time() >= hedge_at):
+                    backup = plan.pop(0)
+                    if not backup.breaker.allow():
+                        # Its circuit opened since the plan was made (e.g. the first attempt failed)
+                        continue
+                    if pending:
+                        LLM_HEDGES.inc(route=backup.name)
+                    pending.add(asyncio.create_task(self._attempt(backup, kind, call, deadline)))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        last = errors[-1] if errors else None
+        raise LLMUnavailableError(f"LLM request failed on every route: {last!r}") from last
+
+    async def ainvoke(self, messages: List[BaseMessage]) -> str:
+        """The model's complete response text."""
+        async def call(model: BaseChatModel):
+            return (await model.ainvoke(messages)).text
+
+        deadline = asyncio.get_running_loop().time() + self.deadline_seconds
+        _, response, _ = await self._race("invoke", call, deadline)
+        return response
+
+    async def astream(self, messages: List[BaseMessage]) -> AsyncIterator[str]:
+        """
+        Stream the response text. Hedging and failover only happen before the
+        first chunk; once streaming has started, a failure is raised.
+        """
+        async def call(model: BaseChatModel):
+            chunks = model.astream(messages)
+            try:
+                return chunks, (await chunks.__anext__()).text
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        deadline = asyncio.get_running_loop().time() + self.deadline_seconds
+        route, (chunks, first), losers = await self._race("stream", call, deadline)
+        for task in losers:
+            await task.result()[1][0].aclose()
+
+        try:
+            yield first
+            while True:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield chunk.text
+        except Exception as e:
+            self._record_failure(route, e)
+            raise
+        finally:
+            await chunks.aclose()
+
+    def invoke(self, messages: List[BaseMessage]) -> str:
+        """Blocking call with failover across routes, but no hedging or deadline."""
+        errors: List[Exception] = []
+        for route in self.routes:
+            if not route.breaker.allow():
+                continue
+            route.breaker.begin()
+            try:
+                response = route.model.invoke(messages).text
+            except Exception as e:
+                self._record_failure(route, e)
+                errors.append(e)
+                continue
+            route.breaker.record_success()
+            LLM_CIRCUIT_OPEN.set(0, route=route.name)
+            LLM_ATTEMPTS.inc(route=route.name, outcome="success")
+            return response
+        last = errors[-1] if errors else None
+        raise LLMUnavailableError(f"LLM request failed on every route: {last!r}") from last
@@ -1,34 +1,89 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
+from typing import Any, Optional
+import json
 import logging
+import time
 
-from app.config import settings
-from app.models import ChatMessage, AnalysisResult, HealthResponse
-from app.vector_store import vector_store
-from app.rag_chain import rag_chain
+from app.config import Settings, get_settings
+from app.metrics import (
+    REGISTRY,
+    MetricsMiddleware,
+    admission_metrics,
+    cache_metrics,
+    http_pool_metrics,
+    session_metrics,
+)
+from app.admission import AdmissionController, AdmissionRejected, get_admission_controller
+from app.sessions import SessionNotFound, SessionStore, get_session_store
+from app.http_clients import get_http_clients
+from app.profiling import ProfilingMiddleware
+from app.models import (
+    ChatMessage,
+    AnalysisResult,
+    BatchAnalysisRequest,
+    BatchAnalysisItem,
+    BatchAnalysisResponse,
+    HealthResponse,
+)
+from app.vector_store import VectorStore, get_vector_store
+from app.rag_chain import RAGChain, get_rag_chain
+from app.llm_router import LLMUnavailableError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _resolve(app: FastAPI, dependency):
+    """Call a dependency outside a request, honouring app.dependency_overrides."""
+    return app.dependency_overrides.get(dependency, dependency)()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     # Startup: Initialize vector store
     logger.info("Initializing vector store...")
+    http_clients = _resolve(app, get_http_clients)
+    http_clients.open()
+    REGISTRY.collector("http_pools", lambda: http_pool_metrics(http_clients.stats))
+    admission = _resolve(app, get_admission_controller)
+    # Admit again if a previous lifespan (e.g. in tests) drained the controller
+    admission.draining = False
+    REGISTRY.collector("admission", lambda: admission_metrics(admission.stats))
+    # The session database is opened on first use; idle sessions are swept as sessions are saved
+    sessions = _resolve(app, get_session_store)
+    REGISTRY.collector("sessions", lambda: session_metrics(sessions.stats))
     try:
+        vector_store = _resolve(app, get_vector_store)
+        rag_chain = _resolve(app, get_rag_chain)
         vector_store.initialize()
         logger.info("Vector store initialized successfully")
+
+        # Build the findings matcher and context blocks up front rather than on the first request
+        rag_chain.findings_extractor
+        rag_chain.context_builder
+
+        REGISTRY.collector("caches", lambda: cache_metrics({
+            "query_embedding": vector_store.embeddings.stats,
+            "response": rag_chain.response_cache.stats if rag_chain.response_cache else None,
+        }))
     except Exception as e:
         logger.error(f"Failed to initialize vector store: {e}")
         raise
 
     yield
 
-    # Shutdown
+    # Shutdown: stop admitting analyses and let running ones finish
     logger.info("Shutting down...")
+    drain_seconds = _resolve(app, get_settings).shutdown_drain_seconds
+    if not await admission.drain(drain_seconds):
+        logger.warning(f"{admission.active} analyses still running after {drain_seconds}s; shutting down anyway")
+    await http_clients.aclose()
 
 
 # Create FastAPI app
@@ -39,10 +94,16 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# On-demand wall-clock profiles of selected requests
+app.add_middleware(ProfilingMiddleware)
+
+# Request durations and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.cors_origins_list,
+    allow_origins=get_settings().cors_origins_list,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -59,11 +120,11 @@ async def root():
 
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
+async def health_check(vector_store: VectorStore = Depends(get_vector_store)):
     """Health check endpoint."""
     try:
         # Check if vector store is initialized
-        if vector_store.vector_store is None:
+        if not vector_store.is_initialized:
             raise HTTPException(status_code=503, detail="Vector store not initialized")
 
         return HealthResponse(
@@ -75,8 +136,25 @@ async def health_check():
         raise HTTPException(status_code=503, detail=str(e))
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms (embedding, search,
+    context, LLM, findings), LLM token counters, cache lookups, outbound
+    connection pool utilization and in-flight gauges. Metrics are per
+    process; with several workers, scrape each one.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/analyze", response_model=AnalysisResult)
-async def analyze_story(message: ChatMessage):
+async def analyze_story(
+    message: ChatMessage,
+    response: Response,
+    rag_chain: RAGChain = Depends(get_rag_chain),
+    admission: AdmissionController = Depends(get_admission_controller),
+    sessions: SessionStore = Depends(get_session_store)
+):
     """
     Analyze a user's relationship story for manipulation patterns.
 
@@ -84,16 +162,56 @@ async def analyze_story(message: ChatMessage):
     1. Retrieve relevant manipulation patterns from the vector database
     2. Generate a contextual analysis using GPT-4
     3. Return structured findings with severity levels
+
+    Near-duplicate stories are served from the response cache; the
+    `X-Cache` response header is `HIT` or `MISS` accordingly. Identical
+    stories submitted while one is in flight share its result. If no LLM
+    route can answer (circuits open, or deadline exceeded), responds 503
+    with Retry-After.
+
+    Under overload, LLM calls beyond the concurrency limit wait in a bounded
+    queue; when it is full, or a request waits too long, it gets a 429 or
+    503 with Retry-After right away. Cache hits and requests sharing an
+    in-flight analysis never wait for a slot.
+
+    With `start_session`, the message opens a multi-turn conversation and
+    the result carries a server-issued `session_id`. Follow-up messages
+    with that `session_id` send only the new message, and the analysis uses
+    the earlier turns' retrieved patterns and a summary of what was said
+    before. The ID is the only credential for the session; an unknown or
+    expired ID gets a 404.
     """
     try:
         logger.info(f"Analyzing message: {message.content[:100]}...")
 
-        # Get analysis from RAG chain
-        result = rag_chain.get_analysis(message.content)
+        if message.start_session or message.session_id is not None:
+            result, session = await rag_chain.aanalyze_turn(sessions, message.session_id, message.content, admission)
+            logger.info(f"Session turn complete ({len(session.turns)} turns). Patterns detected: {result.patterns_detected}")
+            return result
 
-        logger.info(f"Analysis complete. Patterns detected: {result.patterns_detected}")
+        # Get analysis from RAG chain; only an LLM call takes an admission slot
+        result, cache_hit = await rag_chain.aget_cached_analysis(message.content, admission)
+        response.headers["X-Cache"] = "HIT" if cache_hit else "MISS"
+
+        logger.info(f"Analysis complete (cache {'hit' if cache_hit else 'miss'}). Patterns detected: {result.patterns_detected}")
         return result
 
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    except AdmissionRejected as e:
+        logger.warning(f"Analysis rejected: {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except LLMUnavailableError as e:
+        logger.error(f"Analysis failed, LLM unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to analyze story: {str(e)}",
+            headers={"Retry-After": str(int(rag_chain.settings.llm_circuit_reset_seconds))}
+        )
     except Exception as e:
         logger.error(f"Analysis failed: {e}")
         raise HTTPException(
@@ -102,27 +220,193 @@ async def analyze_story(message: ChatMessage):
         )
 
 
+@app.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_batch(
+    request: BatchAnalysisRequest,
+    rag_chain: RAGChain = Depends(get_rag_chain),
+    admission: AdmissionController = Depends(get_admission_controller),
+    settings: Settings = Depends(get_settings)
+):
+    """
+    Analyze many stories in one request (e.g. nightly re-analysis).
+
+    All stories are embedded and retrieved in one batch; LLM generations run
+    with bounded concurrency, and each takes an admission slot like /analyze
+    (a story shed under overload gets an error). Each story gets its own
+    result or error, in input order, so one failure does not fail the batch.
+    """
+    if len(request.messages) > settings.batch_max_stories:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.messages)} stories (max {settings.batch_max_stories})"
+        )
+
+    max_concurrency = min(
+        request.max_concurrency or settings.batch_max_concurrency,
+        settings.batch_max_concurrency
+    )
+
+    try:
+        logger.info(f"Analyzing batch of {len(request.messages)} stories (concurrency {max_concurrency})...")
+        outcomes = await rag_chain.abatch_analysis(
+            [message.content for message in request.messages],
+            max_concurrency=max_concurrency,
+            admission=admission
+        )
+    except Exception as e:
+        logger.error(f"Batch analysis failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to analyze batch: {str(e)}"
+        )
+
+    items = [
+        BatchAnalysisItem(index=i, result=result, error=error)
+        for i, (result, error) in enumerate(outcomes)
+    ]
+    failed = sum(1 for item in items if item.error is not None)
+    logger.info(f"Batch analysis complete. {len(items) - failed} succeeded, {failed} failed")
+
+    return BatchAnalysisResponse(results=items, succeeded=len(items) - failed, failed=failed)
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str, sessions: SessionStore = Depends(get_session_store)):
+    """
+    Forget a multi-turn session and everything the user said in it.
+
+    As for /analyze, the server-issued session ID is the credential: only a
+    caller holding it can delete the session.
+    """
+    if not await sessions.adelete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return Response(status_code=204)
+
+
+def _sse_frame(event: str, data: Any) -> str:
+    """Encode one server-sent event frame with a JSON payload."""
+    if hasattr(data, "model_dump"):
+        data = data.model_dump()
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/analyze/stream")
+async def analyze_story_stream(
+    message: ChatMessage,
+    rag_chain: RAGChain = Depends(get_rag_chain),
+    admission: AdmissionController = Depends(get_admission_controller)
+):
+    """
+    Analyze a user's relationship story, streaming the result as server-sent events.
+
+    Events are sent in this order:
+    1. `patterns` - patterns_detected, as soon as retrieval finishes
+    2. `token` - one per LLM output chunk, interleaved with `finding` events
+       as soon as each pattern's first mention is complete
+    3. `result` - the final AnalysisResult, including findings
+
+    If the analysis fails mid-stream, an `error` event is sent instead of `result`.
+    The stream holds an analysis slot until it ends; when none is available
+    in time, the request gets a 429 or 503 with Retry-After, as for /analyze.
+    Multi-turn sessions are only supported by /analyze: a message with
+    `start_session` or `session_id` gets a 422.
+    """
+    if message.start_session or message.session_id is not None:
+        raise HTTPException(status_code=422, detail="Sessions are not supported when streaming; use /analyze")
+
+    logger.info(f"Streaming analysis for message: {message.content[:100]}...")
+
+    try:
+        await admission.acquire()
+    except AdmissionRejected as e:
+        logger.warning(f"Streaming analysis rejected: {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    started = time.perf_counter()
+    released = False
+
+    def release():
+        # Called when the stream ends and again after the response, whichever happens first wins
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(time.perf_counter() - started)
+
+    async def event_stream():
+        try:
+            async for event, data in rag_chain.astream_analysis(message.content):
+                if event == "result":
+                    logger.info(f"Streaming analysis complete. Patterns detected: {data.patterns_detected}")
+                yield _sse_frame(event, data)
+        except Exception as e:
+            logger.error(f"Streaming analysis failed: {e}")
+            yield _sse_frame("error", {"detail": f"Failed to analyze story: {str(e)}"})
+        finally:
+            release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs if the client disconnects before the stream ends
+        background=BackgroundTask(release)
+    )
+
+
 @app.get("/patterns")
-async def list_patterns():
+async def list_patterns(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    vector_store: VectorStore = Depends(get_vector_store)
+):
     """
-    List all manipulation patterns in the database.
-    Useful for debugging and testing.
+    List every manipulation pattern in the database, grouped by category.
+
+    Served from an in-memory catalog built from collection metadata, so no
+    embedding or search is needed. Pass `category` (e.g. `player_typology`)
+    to filter. The ETag changes whenever the index is re-ingested, so clients
+    can revalidate with If-None-Match and get a 304.
     """
     try:
-        # Do a broad search to get samples
-        docs = vector_store.similarity_search("manipulation pattern", k=20)
-        patterns = list(set([doc.metadata.get('player_type', 'Unknown') for doc in docs]))
-        return {
-            "count": len(patterns),
-            "patterns": patterns
-        }
+        index_version, catalog = vector_store.pattern_catalog()
     except Exception as e:
         logger.error(f"Failed to list patterns: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if category is not None:
+        if category not in catalog:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Unknown category '{category}'. Available: {', '.join(catalog)}"
+            )
+        catalog = {category: catalog[category]}
+
+    etag = f'"{index_version or "none"}:{category or "all"}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+    patterns = [name for names in catalog.values() for name in names]
+    return {
+        "count": len(patterns),
+        "patterns": patterns,
+        "categories": {
+            name: {"count": len(names), "patterns": names}
+            for name, names in catalog.items()
+        },
+        "index_version": index_version
+    }
+
 
 if __name__ == "__main__":
     import uvicorn
+    settings = get_settings()
     uvicorn.run(
         "app.main:app",
         host=settings.api_host,
@@ -0,0 +1,313 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# Latency buckets (seconds) covering in-memory search up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """A named metric with a fixed set of label names; one series per label combination."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """(suffix, labels, value) for every sample of this metric."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing total."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in series:
+            yield "", _format_labels(self.labelnames, key), value
+
+
+class Gauge(Metric):
+    """Value that goes up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str):
+        """Count the enclosed block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in series:
+            yield "", _format_labels(self.labelnames, key), value
+
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets, with their sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, the +Inf overflow, then sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Observe the wall-clock duration of the enclosed block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts)) for key, counts in self._series.items()]
+        for key, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield "_bucket", _format_labels(self.labelnames, key, le), cumulative
+            yield "_sum", _format_labels(self.labelnames, key), counts[-1]
+            yield "_count", _format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    """Metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: Dict[str, Callable[[], Iterable[Metric]]] = {}
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def collector(self, name: str, collect: Callable[[], Iterable[Metric]]):
+        """Add (or replace) a callback producing metrics at scrape time, e.g. from cache stats."""
+        self._collectors[name] = collect
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in list(self._collectors.values()):
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "fia_stage_duration_seconds",
+    "Time spent in each stage of an analysis.",
+    ["stage"],
+    registry=REGISTRY
+)
+LLM_TOKENS = Counter(
+    "fia_llm_tokens_total",
+    "Prompt and completion tokens sent to and received from the LLM (tiktoken counts).",
+    ["kind"],
+    registry=REGISTRY
+)
+LLM_IN_FLIGHT = Gauge(
+    "fia_llm_requests_in_flight",
+    "LLM calls currently in progress.",
+    registry=REGISTRY
+)
+LLM_ATTEMPTS = Counter(
+    "fia_llm_attempts_total",
+    "LLM attempts per route by outcome (success, error, timeout, or cancelled after losing a hedge).",
+    ["route", "outcome"],
+    registry=REGISTRY
+)
+LLM_HEDGES = Counter(
+    "fia_llm_hedges_total",
+    "Hedged LLM requests, by the route the hedge was sent to.",
+    ["route"],
+    registry=REGISTRY
+)
+LLM_CIRCUIT_OPEN = Gauge(
+    "fia_llm_circuit_open",
+    "1 while a route's circuit breaker is open.",
+    ["route"],
+    registry=REGISTRY
+)
+COALESCED = Counter(
+    "fia_coalesced_total",
+    "Calls that attached to an identical in-flight computation instead of starting their own.",
+    ["kind"],
+    registry=REGISTRY
+)
+HTTP_SECONDS = Histogram(
+    "fia_http_request_duration_seconds",
+    "HTTP request duration until the response body is complete.",
+    ["method", "route", "status"],
+    registry=REGISTRY
+)
+HTTP_IN_FLIGHT = Gauge(
+    "fia_http_requests_in_flight",
+    "HTTP requests currently being handled.",
+    registry=REGISTRY
+)
+
+
+def cache_metrics(caches: Dict[str, Optional[dict]]) -> List[Metric]:
+    """Lookup counters and sizes from the `stats` of each cache (None for a disabled cache)."""
+    lookups = Counter("fia_cache_lookups_total", "Cache lookups by result.", ["cache", "result"])
+    entries = Gauge("fia_cache_entries", "Entries currently held in memory by each cache.", ["cache"])
+    for name, stats in caches.items():
+        if stats is None:
+            continue
+        lookups.inc(stats["hits"], cache=name, result="hit")
+        lookups.inc(stats["misses"], cache=name, result="miss")
+        entries.set(stats["size"], cache=name)
+    return [lookups, entries]
+
+
+def http_pool_metrics(pools: Dict[str, Dict[str, int]]) -> List[Metric]:
+    """Utilization of each outbound HTTP connection pool, from `HTTPClients.stats`."""
+    in_flight = Gauge("fia_http_pool_requests_in_flight", "Outbound requests sent and not yet completed.", ["client"])
+    waiting = Gauge("fia_http_pool_requests_waiting", "Outbound requests beyond the connection limit.", ["client"])
+    limit = Gauge("fia_http_pool_max_connections", "Connection limit of each outbound pool.", ["client"])
+    for name, stats in pools.items():
+        in_flight.set(stats["in_flight"], client=name)
+        waiting.set(stats["waiting"], client=name)
+        limit.set(stats["max_connections"], client=name)
+    return [in_flight, waiting, limit]
+
+
+def admission_metrics(stats: Dict) -> List[Metric]:
+    """Running and queued analyses and rejections, from `AdmissionController.stats`."""
+    analyses = Gauge("fia_admission_analyses", "Analyses running or waiting for a slot.", ["state"])
+    analyses.set(stats["active"], state="running")
+    analyses.set(stats["queued"], state="queued")
+    admitted = Counter("fia_admission_admitted_total", "Analyses admitted.")
+    admitted.inc(stats["admitted"])
+    rejected = Counter("fia_admission_rejected_total", "Analyses shed, by reason.", ["reason"])
+    for reason, count in stats["rejected"].items():
+        rejected.inc(count, reason=reason)
+    return [analyses, admitted, rejected]
+
+
+def session_metrics(stats: Dict[str, int]) -> List[Metric]:
+    """Sessions held in memory, from `SessionStore.stats`."""
+    sessions = Gauge("fia_sessions_in_memory", "Multi-turn sessions held in memory.")
+    sessions.set(stats["size"])
+    return [sessions]
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording HTTP request durations and in-flight requests.
+
+    Requests are labelled with the matched route template (e.g. /analyze),
+    not the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status
+            )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional, Literal
 
 
@@ -18,6 +18,21 @@ class ChatMessage(BaseModel):
     """Chat message from user."""
 
     content: str = Field(..., description="User's message/question")
+    start_session: bool = Field(
+        False,
+        description="Start a multi-turn conversation; the result carries the server-issued session_id"
+    )
+    session_id: Optional[str] = Field(
+        None,
+        pattern=r"^[A-Za-z0-9_-]{1,64}$",
+        description="Server-issued conversation ID; follow-up messages with it only send the new message"
+    )
+
+    @model_validator(mode="after")
+    def _one_session_field(self):
+        if self.start_session and self.session_id is not None:
+            raise ValueError("start_session and session_id are mutually exclusive")
+        return self
 
 
 class Finding(BaseModel):
@@ -36,6 +51,30 @@ class AnalysisResult(BaseModel):
     findings: List[Finding] = Field(default_factory=list, description="Specific findings from analysis")
     patterns_detected: List[str] = Field(default_factory=list, description="List of manipulation patterns detected")
     confidence_score: Optional[float] = Field(None, ge=0.0, le=1.0, description="Confidence in analysis (0-1)")
+    session_id: Optional[str] = Field(None, description="Session of a multi-turn conversation, to send with follow-up messages")
+
+
+class BatchAnalysisRequest(BaseModel):
+    """Batch of stories to analyze together."""
+
+    messages: List[ChatMessage] = Field(..., description="Stories to analyze")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Maximum concurrent LLM generations (defaults to server setting)")
+
+
+class BatchAnalysisItem(BaseModel):
+    """Outcome of analyzing one story in a batch."""
+
+    index: int = Field(..., description="Position of the story in the request")
+    result: Optional[AnalysisResult] = Field(None, description="Analysis result, if it succeeded")
+    error: Optional[str] = Field(None, description="Error message, if the analysis failed")
+
+
+class BatchAnalysisResponse(BaseModel):
+    """Results of a batch analysis, in input order."""
+
+    results: List[BatchAnalysisItem] = Field(default_factory=list)
+    succeeded: int = Field(0, description="Number of stories analyzed successfully")
+    failed: int = Field(0, description="Number of stories that failed")
 
 
 class HealthResponse(BaseModel):
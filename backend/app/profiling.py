@@ -0,0 +1,237 @@
+import asyncio
+import gc
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional
+
+from app.config import Settings, get_settings
+from app.single_flight import computing_task
+
+
+logger = logging.getLogger(__name__)
+
+# Client-supplied request IDs are used as file names, so only these are accepted
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # ";" separates frames in the folded format
+    name = getattr(code, "co_qualname", code.co_name).replace(";", ":")
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _awaited(obj):
+    """Frame of a coroutine, generator or async generator and what it is waiting on."""
+    for frame_attr, await_attr in (("cr_frame", "cr_await"), ("ag_frame", "ag_await"), ("gi_frame", "gi_yieldfrom")):
+        if hasattr(obj, frame_attr):
+            return getattr(obj, frame_attr), getattr(obj, await_attr)
+    return None, None
+
+
+class TaskProfiler:
+    """
+    Wall-clock sampling profiler for one asyncio task.
+
+    A background thread samples the task every `interval` seconds. While the
+    task runs, the sample is the event loop thread's stack from the task's
+    coroutine down; while it is suspended, the sample is its chain of awaits,
+    ending in what it waits on (e.g. `<await Future>` for an LLM call or a
+    worker thread). A task waiting on a coalesced computation (SingleFlight)
+    is followed into the task that runs it. Each sample is weighted by the time since the previous
+    one, so pauses that hold the GIL (large GC runs) are still accounted for.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float = 0.005):
+        self.task = task
+        self.interval = interval
+        self.loop_thread = threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.gc_collections = 0
+        self.gc_seconds = 0.0
+        self._gc_started: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="task-profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        gc.callbacks.append(self._on_gc)
+        self._thread.start()
+
+    def stop(self) -> float:
+        """Stop sampling; returns the profiled wall-clock duration in seconds."""
+        self._stop.set()
+        self._thread.join()
+        gc.callbacks.remove(self._on_gc)
+        self.duration = time.perf_counter() - self.started
+        return self.duration
+
+    def _on_gc(self, phase: str, info: dict):
+        # Collections are process-wide, so this includes those triggered by concurrent requests
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            self.gc_collections += 1
+            self.gc_seconds += time.perf_counter() - self._gc_started
+            self._gc_started = None
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            stack = self._sample()
+            if stack:
+                self.stacks[stack] += now - last
+                self.samples += 1
+            last = now
+
+    def _sample(self) -> Optional[str]:
+        if self.task.done():
+            return None
+        coro = self.task.get_coro()
+        if getattr(coro, "cr_running", False):
+            stack = self._running_stack(coro)
+            if stack is not None:
+                return stack
+        return self._suspended_stack(self.task)
+
+    def _running_stack(self, coro) -> Optional[str]:
+        frame = sys._current_frames().get(self.loop_thread)
+        labels: List[str] = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            if frame is coro.cr_frame:
+                return ";".join(reversed(labels))
+            frame = frame.f_back
+        # The task was suspended between the check and the snapshot
+        return None
+
+    def _suspended_stack(self, task: asyncio.Task) -> Optional[str]:
+        labels: List[str] = []
+        obj = task.get_coro()
+        while obj is not None:
+            frame, awaited = _awaited(obj)
+            if frame is None:
+                if isinstance(obj, asyncio.Task):
+                    # Awaiting another task directly: follow it
+                    task, obj = obj, obj.get_coro()
+                    continue
+                # Waiting on a coalesced computation (SingleFlight) that runs in its own task: follow it
+                leader = computing_task(getattr(task, "_fut_waiter", None))
+                if leader is not None and not leader.done():
+                    coro = leader.get_coro()
+                    if getattr(coro, "cr_running", False):
+                        running = self._running_stack(coro)
+                        if running is not None:
+                            labels.append(running)
+                            break
+                    task, obj = leader, coro
+                    continue
+                # Awaiting a future yields through its iterator (FutureIter)
+                name = type(obj).__name__
+                labels.append(f"<await {'Future' if 'Future' in name else name}>")
+                break
+            labels.append(_frame_label(frame))
+            obj = awaited
+        return ";".join(labels) or None
+
+    def folded(self) -> str:
+        """Samples in the folded-stack format (one `frame;frame;... microseconds` line per stack)."""
+        lines = [
+            f"{stack} {max(1, round(seconds * 1e6))}"
+            for stack, seconds in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _write_profile(directory: str, request_id: str, profiler: TaskProfiler, details: dict) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{request_id}.folded")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(profiler.folded())
+    with open(os.path.join(directory, f"{request_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump({
+            "request_id": request_id,
+            **details,
+            "duration_ms": round(profiler.duration * 1000, 3),
+            "samples": profiler.samples,
+            "interval_ms": profiler.interval * 1000,
+            "gc": {"collections": profiler.gc_collections, "ms": round(profiler.gc_seconds * 1000, 3)},
+        }, f, indent=2)
+    return path
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling selected requests on demand.
+
+    A request to one of `profile_paths` is profiled when it carries
+    `X-Profile: 1` (and `profile_header_enabled` is set) or is picked by
+    `profile_sample_rate`. The profile covers the whole request in the
+    handler's task: body parsing, dependencies, retrieval, prompt building,
+    the LLM call and parsing. It is written to `profile_directory` as
+    `<request id>.folded` (open it in speedscope or flamegraph.pl) with a
+    `<request id>.json` summary. The request ID is taken from X-Request-ID
+    if valid, else generated, and returned in the X-Request-ID header.
+    """
+
+    def __init__(self, app, settings: Optional[Settings] = None):
+        self.app = app
+        self._settings = settings
+
+    @property
+    def settings(self) -> Settings:
+        if self._settings is None:
+            self._settings = get_settings()
+        return self._settings
+
+    def _should_profile(self, scope) -> bool:
+        settings = self.settings
+        paths = [path.strip() for path in settings.profile_paths.split(",") if path.strip()]
+        if scope["path"] not in paths:
+            return False
+        if settings.profile_header_enabled:
+            headers = dict(scope["headers"])
+            if headers.get(b"x-profile", b"").strip() in (b"1", b"true"):
+                return True
+        return settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        supplied = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = supplied if _REQUEST_ID.match(supplied) else uuid.uuid4().hex
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        profiler = TaskProfiler(asyncio.current_task(), interval=self.settings.profile_interval_ms / 1000)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = profiler.stop()
+            details = {"method": scope["method"], "path": scope["path"], "status": status}
+            try:
+                path = await asyncio.to_thread(
+                    _write_profile, self.settings.profile_directory, request_id, profiler, details
+                )
+                logger.info(f"Profiled {scope['method']} {scope['path']} ({duration * 1000:.1f} ms): {path}")
+            except OSError as e:
+                logger.warning(f"Failed to write profile {request_id}: {e}")
@@ -1,22 +1,49 @@
-from typing import List, Dict, Any
-from langchain_openai import ChatOpenAI
+import asyncio
+import contextlib
+import time
+from functools import lru_cache
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from app.config import settings
-from app.vector_store import vector_store
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from app.config import Settings, get_settings, require_openai_api_key
+from app.vector_store import VectorStore, document_name, get_vector_store
 from app.models import AnalysisResult, Finding
+from app.response_cache import ResponseCache
+from app.findings import FindingsExtractor
+from app.context_builder import ContextBuilder
+from app.metrics import LLM_IN_FLIGHT, LLM_TOKENS, STAGE_SECONDS
+from app.llm_router import CircuitBreaker, LLMRoute, LLMRouter
+from app.http_clients import get_http_clients
+from app.single_flight import SingleFlight, normalize_text
+from app.admission import AdmissionController
+from app.sessions import Session, SessionNotFound, SessionStore, new_session_id
+from app.tokens import count_tokens
 
 
 class RAGChain:
     """RAG chain for analyzing relationship stories and detecting manipulation patterns."""
 
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0.3,
-            openai_api_key=settings.openai_api_key
-        )
+    def __init__(
+        self,
+        vector_store: Optional[VectorStore] = None,
+        llm: Optional[BaseChatModel] = None,
+        settings: Optional[Settings] = None,
+        fallback_llm: Optional[BaseChatModel] = None
+    ):
+        """
+        Cheap to construct: the chat models are built on first use. Pass
+        `vector_store`, `llm` or `fallback_llm` (e.g. stubs) to override the
+        defaults.
+        """
+        self.settings = settings or get_settings()
+        self.vector_store = vector_store or get_vector_store()
+        self._llm = llm
+        self._fallback_llm = fallback_llm
+        self._llm_router: Optional[LLMRouter] = None
+        # Models built here (not injected) and the HTTP client generation they were built on
+        self._built_models: List[str] = []
+        self._http_generation: Optional[int] = None
 
         # System prompt for analyzing relationship dynamics
         self.system_prompt = """You are a compassionate AI assistant specializing in identifying manipulation patterns in relationships.
@@ -48,17 +75,126 @@ Provide a thoughtful analysis that includes:
 5. Gentle encouragement toward support resources if needed"""
 
         self.prompt = ChatPromptTemplate.from_template(self.system_prompt)
+        self.prompt_template_tokens = count_tokens(self.system_prompt)
+
+        # Semantic cache of results for near-duplicate stories
+        self.response_cache = ResponseCache(
+            max_size=self.settings.response_cache_size,
+            ttl_seconds=self.settings.response_cache_ttl_seconds,
+            threshold=self.settings.response_cache_similarity_threshold
+        ) if self.settings.response_cache_enabled else None
+
+        # Identical stories analyzed concurrently share one computation
+        self._inflight_analyses = SingleFlight("analysis")
+        self._inflight_generations = SingleFlight("generation")
+
+        # Built lazily from the collection, keyed on index version
+        self._findings_extractor: Optional[Tuple[Optional[str], FindingsExtractor]] = None
+        self._context_builder: Optional[Tuple[Optional[str], ContextBuilder]] = None
+
+    def _chat_model(self, model: str) -> BaseChatModel:
+        # Imported here: the OpenAI client is slow to import
+        from langchain_openai import ChatOpenAI
+        http_clients = get_http_clients()
+        self._http_generation = http_clients.generation
+        return ChatOpenAI(
+            model=model,
+            temperature=0.3,
+            openai_api_key=require_openai_api_key(self.settings),
+            base_url=self.settings.openai_base_url or None,
+            http_client=http_clients.client,
+            http_async_client=http_clients.async_client,
+            timeout=http_clients.timeout,
+            # The router retries on another attempt, within the request deadline
+            max_retries=0
+        )
+
+    def _drop_stale_models(self):
+        """Forget built models whose HTTP clients were closed since (e.g. by a previous app lifespan)."""
+        if self._http_generation is None or self._http_generation == get_http_clients().generation:
+            return
+        for name in self._built_models:
+            setattr(self, name, None)
+        self._built_models = []
+        self._http_generation = None
+        self._llm_router = None
+
+    @property
+    def llm(self) -> BaseChatModel:
+        self._drop_stale_models()
+        if self._llm is None:
+            self._llm = self._chat_model(self.settings.llm_model)
+            self._built_models.append("_llm")
+        return self._llm
+
+    @property
+    def llm_router(self) -> LLMRouter:
+        """
+        Deadline, hedging and circuit breaking over the primary model and the
+        fallback model, if one is configured.
+        """
+        self._drop_stale_models()
+        if self._llm_router is None:
+            def route(name: str, model: BaseChatModel) -> LLMRoute:
+                return LLMRoute(name, model, CircuitBreaker(
+                    failure_threshold=self.settings.llm_circuit_failure_threshold,
+                    reset_seconds=self.settings.llm_circuit_reset_seconds
+                ))
+
+            routes = [route("primary", self.llm)]
+            if self._fallback_llm is None and self.settings.llm_fallback_model:
+                self._fallback_llm = self._chat_model(self.settings.llm_fallback_model)
+                self._built_models.append("_fallback_llm")
+            if self._fallback_llm is not None:
+                routes.append(route("fallback", self._fallback_llm))
+            self._llm_router = LLMRouter(
+                routes,
+                deadline_seconds=self.settings.llm_deadline_seconds,
+                hedge_enabled=self.settings.llm_hedge_enabled,
+                hedge_percentile=self.settings.llm_hedge_percentile,
+                hedge_min_delay=self.settings.llm_hedge_min_delay_seconds
+            )
+        return self._llm_router
+
+    @property
+    def context_builder(self) -> ContextBuilder:
+        """
+        Pre-rendered context blocks for every document, rebuilt when the index is re-ingested.
+
+        With the mmap backend, blocks are rendered on first use instead, so
+        workers do not decode every mapped document at startup.
+        """
+        index_version, documents = self.vector_store.collection_documents()
+        if self._context_builder is None or self._context_builder[0] != index_version:
+            prerendered = documents if self.vector_store.backend != "mmap" else ()
+            self._context_builder = (index_version, ContextBuilder(prerendered))
+        return self._context_builder[1]
 
-    def format_docs(self, docs) -> str:
+    def build_context(self, docs: List[Document], question: str = "") -> Tuple[str, int]:
+        """
+        Pack retrieved documents into the prompt token budget.
+
+        The budget left for context is PROMPT_TOKEN_BUDGET minus the prompt
+        template and the user's story. Returns the context and its token count.
+        """
+        with STAGE_SECONDS.time(stage="context"):
+            budget = self.settings.prompt_token_budget - self.prompt_template_tokens - count_tokens(question)
+            return self.context_builder.build(docs, max(budget, 0))
+
+    def format_docs(self, docs: List[Document], question: str = "") -> str:
         """Format retrieved documents for context."""
-        formatted = []
-        for doc in docs:
-            formatted.append(f"Pattern: {doc.metadata.get('player_type', 'Unknown')}")
-            formatted.append(f"Description: {doc.page_content}")
-            formatted.append(f"Tactics: {doc.metadata.get('core_tactics', 'N/A')}")
-            formatted.append(f"Red Flags: {doc.metadata.get('red_flags', 'N/A')}")
-            formatted.append("---")
-        return "\n".join(formatted)
+        context, _ = self.build_context(docs, question)
+        return context
+
+    def _prompt_inputs(self, docs: List[Document], question: str) -> Tuple[Dict[str, str], int]:
+        """Prompt variables for a story and its documents, with the prompt's token count."""
+        context, context_tokens = self.build_context(docs, question)
+        prompt_tokens = self.prompt_template_tokens + count_tokens(question) + context_tokens
+        return {"context": context, "question": question}, prompt_tokens
+
+    def _record_tokens(self, prompt_tokens: int, response: str):
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(count_tokens(response), kind="completion")
 
     def analyze_story(self, user_message: str) -> Dict[str, Any]:
         """
@@ -66,82 +202,308 @@ Provide a thoughtful analysis that includes:
 
         Returns both the raw LLM response and retrieved patterns.
         """
-        # Get retriever
-        retriever = vector_store.get_retriever(search_kwargs={"k": 5})
-
-        # Build RAG chain
-        rag_chain = (
-            {
-                "context": retriever | self.format_docs,
-                "question": RunnablePassthrough()
-            }
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        # Retrieve once; the documents feed both the prompt and patterns_detected
+        with STAGE_SECONDS.time(stage="retrieval"):
+            retriever = self.vector_store.get_retriever(search_kwargs={"k": 5})
+            retrieved_docs = retriever.invoke(user_message)
 
-        # Get response
-        response = rag_chain.invoke(user_message)
+        inputs, prompt_tokens = self._prompt_inputs(retrieved_docs, user_message)
+        with LLM_IN_FLIGHT.track_inprogress(), STAGE_SECONDS.time(stage="llm"):
+            response = self.llm_router.invoke(self.prompt.format_messages(**inputs))
+        self._record_tokens(prompt_tokens, response)
 
-        # Get retrieved documents for metadata
-        retrieved_docs = retriever.invoke(user_message)
-        patterns_detected = [doc.metadata.get('player_type', 'Unknown') for doc in retrieved_docs]
+        return {
+            "response": response,
+            "retrieved_docs": retrieved_docs,
+            "patterns_detected": self._patterns_from_docs(retrieved_docs)
+        }
+
+    async def aanalyze_story(self, user_message: str) -> Dict[str, Any]:
+        """
+        Async version of analyze_story.
+
+        Retrieves once and reuses the documents for both the prompt context and
+        the detected patterns, so a request costs at most one embedding call
+        and one LLM call, none of which block the event loop.
+        """
+        _, retrieved_docs = await self.vector_store.aretrieve(user_message, k=5)
+        response = await self._agenerate(user_message, retrieved_docs)
 
         return {
             "response": response,
             "retrieved_docs": retrieved_docs,
-            "patterns_detected": list(set(patterns_detected))  # Remove duplicates
+            "patterns_detected": self._patterns_from_docs(retrieved_docs)
         }
 
-    def parse_response_to_findings(self, llm_response: str, patterns: List[str]) -> List[Finding]:
+    async def _agenerate(self, user_message: str, retrieved_docs: List[Document]) -> str:
+        """Run the LLM over the prompt built from already retrieved documents."""
+        inputs, prompt_tokens = self._prompt_inputs(retrieved_docs, user_message)
+        with LLM_IN_FLIGHT.track_inprogress(), STAGE_SECONDS.time(stage="llm"):
+            response = await self.llm_router.ainvoke(self.prompt.format_messages(**inputs))
+        self._record_tokens(prompt_tokens, response)
+        return response
+
+    def _patterns_from_docs(self, docs: List[Document]) -> List[str]:
+        patterns_detected = [document_name(doc.metadata) for doc in docs]
+        return list(set(patterns_detected))  # Remove duplicates
+
+    @property
+    def findings_extractor(self) -> FindingsExtractor:
+        """
+        Matcher over the whole pattern vocabulary, rebuilt when the index is re-ingested.
+        """
+        index_version, metadatas = self.vector_store.collection_metadatas()
+        if self._findings_extractor is None or self._findings_extractor[0] != index_version:
+            self._findings_extractor = (index_version, FindingsExtractor(metadatas))
+        return self._findings_extractor[1]
+
+    def parse_response_to_findings(self, llm_response: str) -> List[Finding]:
         """
         Parse LLM response into structured findings.
-        This is a simple implementation - you may want to enhance this with
-        structured output from the LLM using function calling.
-        """
-        findings = []
-
-        # Simple heuristic: look for danger/warning keywords
-        # In production, you'd want the LLM to output structured JSON
-        lines = llm_response.split('\n')
-
-        for pattern in patterns:
-            if pattern.lower() in llm_response.lower():
-                # Determine severity based on keywords
-                severity = "info"
-                if any(word in llm_response.lower() for word in ["dangerous", "serious", "urgent", "abuse"]):
-                    severity = "danger"
-                elif any(word in llm_response.lower() for word in ["concerning", "warning", "red flag"]):
-                    severity = "warning"
-
-                findings.append(Finding(
-                    type=severity,
-                    title=f"Pattern Detected: {pattern}",
-                    description=f"This behavior pattern matches known manipulation tactics.",
-                    matched_pattern=pattern
-                ))
 
-        return findings
+        Scans the response once for every known pattern name, alias, abuse
+        flavor, trauma sign and vulnerability type (not only the retrieved
+        ones). Each finding's severity comes from the cues in the sentences
+        that mention it.
+        """
+        extractor = self.findings_extractor
+        with STAGE_SECONDS.time(stage="findings"):
+            return extractor.extract(llm_response)
 
     def get_analysis(self, user_message: str) -> AnalysisResult:
         """
         Main method to get complete analysis result.
         """
         result = self.analyze_story(user_message)
+        return self.build_result(result["response"], result["patterns_detected"])
+
+    async def aget_analysis(self, user_message: str) -> AnalysisResult:
+        """
+        Async version of get_analysis, used by the API.
+        """
+        result, _ = await self.aget_cached_analysis(user_message)
+        return result
+
+    async def aget_cached_analysis(
+        self,
+        user_message: str,
+        admission: Optional[AdmissionController] = None
+    ) -> Tuple[AnalysisResult, bool]:
+        """
+        Get an analysis, serving near-duplicate stories from the response cache.
 
-        # Parse findings from response
-        findings = self.parse_response_to_findings(
-            result["response"],
-            result["patterns_detected"]
+        Concurrent requests for the same story (after whitespace
+        normalization), e.g. double submits or client retries, share one
+        retrieval and LLM call and all get its result or error. Only the
+        LLM call holds an `admission` slot, so cache hits and requests
+        sharing an in-flight analysis are never queued or shed. Returns the
+        result and whether it came from the cache.
+        """
+        (result, cache_hit), _ = await self._inflight_analyses.do(
+            normalize_text(user_message),
+            lambda: self._aretrieve_and_analyze(user_message, admission)
         )
+        return result, cache_hit
+
+    async def _aretrieve_and_analyze(
+        self,
+        user_message: str,
+        admission: Optional[AdmissionController] = None
+    ) -> Tuple[AnalysisResult, bool]:
+        embedding, retrieved_docs = await self.vector_store.aretrieve(user_message, k=5)
+        return await self._aanalyze_retrieved(user_message, embedding, retrieved_docs, admission)
+
+    async def aanalyze_turn(
+        self,
+        sessions: SessionStore,
+        session_id: Optional[str],
+        user_message: str,
+        admission: Optional[AdmissionController] = None
+    ) -> Tuple[AnalysisResult, Session]:
+        """
+        Analyze the next message of a multi-turn session.
+
+        Without a `session_id`, starts a new session under a server-issued
+        ID (returned in the result); an ID that is unknown, deleted or
+        expired raises SessionNotFound rather than starting a session under
+        a client-chosen ID. Only the new message is embedded and retrieved;
+        its documents are merged with those of earlier turns (from the
+        pre-rendered context blocks), and the prompt carries a running
+        summary of the earlier turns instead of the whole conversation.
+        Turns of one session run one at a time, and a resubmitted turn shares
+        the in-flight one. The session is only updated if the turn succeeds.
+        Session turns bypass the response cache, since their context depends
+        on the session. As in aget_cached_analysis, only the LLM call holds
+        an `admission` slot.
+        """
+        async def analyze_turn(session: Session) -> Tuple[AnalysisResult, Session]:
+            _, new_docs = await self.vector_store.aretrieve(user_message, k=5)
+            document_ids = session.merge_documents(
+                [doc.id for doc in new_docs if doc.id],
+                self.settings.session_max_documents
+            )
+            docs = self.vector_store.documents_by_id(document_ids)
+
+            async with _admitted(admission):
+                response = await self._agenerate(session.question(user_message), docs)
+            result = self.build_result(response, self._patterns_from_docs(docs))
+            result.session_id = session.session_id
+
+            session.add_turn(
+                user_message,
+                document_ids,
+                max_turns=self.settings.session_max_turns,
+                summary_token_budget=self.settings.session_summary_token_budget
+            )
+            await sessions.asave(session)
+            return result, session
+
+        if session_id is None:
+            # Nobody else knows the new ID yet, so there is nothing to lock or share
+            return await analyze_turn(Session(new_session_id()))
+
+        async def continue_session() -> Tuple[AnalysisResult, Session]:
+            async with sessions.lock(session_id):
+                session = await sessions.aget(session_id)
+                if session is None:
+                    raise SessionNotFound(session_id)
+                return await analyze_turn(session)
+
+        (result, session), _ = await self._inflight_analyses.do(
+            ("session", session_id, normalize_text(user_message)),
+            continue_session
+        )
+        return result, session
+
+    async def abatch_analysis(
+        self,
+        user_messages: List[str],
+        max_concurrency: int = 8,
+        admission: Optional[AdmissionController] = None
+    ) -> List[Tuple[Optional[AnalysisResult], Optional[str]]]:
+        """
+        Analyze many stories together.
+
+        All stories are embedded in one batched call and retrieved in one
+        batched search; LLM generations then run with at most
+        `max_concurrency` in flight, each taking an `admission` slot like a
+        single analysis. A failing (or shed) story does not affect the
+        others. Returns (result, error) pairs in input order.
+        """
+        embeddings, retrieved = await self.vector_store.abatch_similarity_search(user_messages, k=5)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def analyze_one(user_message, embedding, retrieved_docs):
+            async with semaphore:
+                try:
+                    result, _ = await self._aanalyze_retrieved(user_message, embedding, retrieved_docs, admission)
+                    return result, None
+                except Exception as e:
+                    return None, str(e)
+
+        return await asyncio.gather(*(
+            analyze_one(user_message, embedding, retrieved_docs)
+            for user_message, embedding, retrieved_docs in zip(user_messages, embeddings, retrieved)
+        ))
+
+    async def _aanalyze_retrieved(
+        self,
+        user_message: str,
+        embedding: Optional[List[float]],
+        retrieved_docs: List[Document],
+        admission: Optional[AdmissionController] = None
+    ) -> Tuple[AnalysisResult, bool]:
+        """
+        Generate (or fetch from the response cache) the result for an already retrieved story.
+
+        The response cache is keyed on the story embedding, so it is skipped
+        when retrieval ran without one (lexical-only). Identical stories in
+        flight at once (e.g. repeated within a batch) share one LLM call;
+        only that call waits for an `admission` slot.
+        """
+        patterns_detected = self._patterns_from_docs(retrieved_docs)
+        use_cache = self.response_cache is not None and embedding is not None
+        index_version = self.vector_store.index_version
+
+        if use_cache:
+            cached = self.response_cache.get(embedding, patterns_detected, index_version)
+            if cached is not None:
+                return cached, True
+
+        async def generate() -> AnalysisResult:
+            async with _admitted(admission):
+                response = await self._agenerate(user_message, retrieved_docs)
+            result = self.build_result(response, patterns_detected)
+            if use_cache:
+                self.response_cache.put(embedding, patterns_detected, result, index_version)
+            return result
+
+        result, _ = await self._inflight_generations.do(normalize_text(user_message), generate)
+        return result, False
+
+    async def astream_analysis(self, user_message: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream an analysis as (event, data) pairs.
+
+        Yields "patterns" with the detected patterns as soon as retrieval
+        finishes, then one "token" per LLM chunk, interleaved with a
+        "finding" for each pattern as soon as the sentence first mentioning
+        it is complete, then a final "result" carrying the complete
+        AnalysisResult.
+        """
+        _, retrieved_docs = await self.vector_store.aretrieve(user_message, k=5)
+        patterns_detected = self._patterns_from_docs(retrieved_docs)
+        yield "patterns", patterns_detected
+
+        inputs, prompt_tokens = self._prompt_inputs(retrieved_docs, user_message)
+        scanner = self.findings_extractor.scanner()
+        chunks = []
+        started = time.perf_counter()
+        with LLM_IN_FLIGHT.track_inprogress(), STAGE_SECONDS.time(stage="llm_stream"):
+            async for chunk in self.llm_router.astream(self.prompt.format_messages(**inputs)):
+                if not chunks:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_first_token")
+                chunks.append(chunk)
+                yield "token", chunk
+                for finding in scanner.feed(chunk):
+                    yield "finding", finding
+
+        response = "".join(chunks)
+        self._record_tokens(prompt_tokens, response)
+        yield "result", self.build_result(response, patterns_detected, findings=scanner.finish())
+
+    def build_result(
+        self,
+        response: str,
+        patterns_detected: List[str],
+        findings: Optional[List[Finding]] = None
+    ) -> AnalysisResult:
+        """Build the final AnalysisResult from a complete LLM response."""
+        # Parse findings from response, unless they were extracted while streaming
+        if findings is None:
+            findings = self.parse_response_to_findings(response)
 
         return AnalysisResult(
-            content=result["response"],
+            content=response,
             findings=findings,
-            patterns_detected=result["patterns_detected"],
+            patterns_detected=patterns_detected,
             confidence_score=None  # Can implement confidence scoring later
         )
 
 
-# Global RAG chain instance
-rag_chain = RAGChain()
+def _admitted(admission: Optional[AdmissionController]) -> contextlib.AbstractAsyncContextManager:
+    """An admission slot for the enclosed LLM call, or no limit without a controller."""
+    return admission.admit() if admission is not None else contextlib.nullcontext()
+
+
+@lru_cache(maxsize=None)
+def get_rag_chain() -> RAGChain:
+    """The process-wide RAG chain, created on first use."""
+    return RAGChain()
+
+
+def __getattr__(name: str):
+    # `from app.rag_chain import rag_chain` keeps working, but builds the chain lazily
+    if name == "rag_chain":
+        return get_rag_chain()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
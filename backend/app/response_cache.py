@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from app.models import AnalysisResult
+
+
+class ResponseCache:
+    """
+    Semantic cache of analysis results, keyed on the story embedding.
+
+    A cached result is reused when a new story's embedding is within the
+    cosine similarity threshold of a cached story and retrieval returned the
+    same set of patterns. Entries are evicted LRU-first once the cache is
+    full, expire after a TTL, and are all dropped when the index version
+    changes (i.e. the data was re-ingested).
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 3600.0, threshold: float = 0.97):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._index_version: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, index_version: Optional[str]):
+        """Drop every entry if the index changed since they were cached. Caller holds the lock."""
+        if index_version != self._index_version:
+            self._entries.clear()
+            self._index_version = index_version
+
+    def get(
+        self,
+        embedding: List[float],
+        patterns: List[str],
+        index_version: Optional[str] = None
+    ) -> Optional[AnalysisResult]:
+        """Return a cached result for a near-duplicate story, or None."""
+        query = self._normalize(embedding)
+        pattern_set = frozenset(patterns)
+        now = time.time()
+
+        with self._lock:
+            self._check_version(index_version)
+
+            best_id, best_score = None, self.threshold
+            for entry_id, (vector, entry_patterns, result, created_at) in list(self._entries.items()):
+                if now - created_at > self.ttl_seconds:
+                    del self._entries[entry_id]
+                    continue
+                if entry_patterns != pattern_set:
+                    continue
+                score = float(np.dot(query, vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def put(
+        self,
+        embedding: List[float],
+        patterns: List[str],
+        result: AnalysisResult,
+        index_version: Optional[str] = None
+    ):
+        """Cache a result for a story."""
+        entry = (self._normalize(embedding), frozenset(patterns), result, time.time())
+
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> dict:
+        """Hit/miss counters for the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.lexical_index import BM25Index
+
+
+# Files of one exported index version
+MANIFEST = "manifest.json"
+EMBEDDINGS = "embeddings.npy"
+SQUARED_NORMS = "squared_norms.npy"
+OFFSETS = "offsets.npy"
+RECORDS = "records.bin"
+# Name of the file pointing at the current version
+CURRENT = "CURRENT"
+
+
+class MappedDocuments(Sequence[Document]):
+    """
+    Documents stored as concatenated JSON records in a memory-mapped file.
+
+    A document is decoded only when it is accessed, so processes that map
+    the same file share its pages instead of each holding every document.
+    """
+
+    def __init__(self, records: np.ndarray, offsets: np.ndarray):
+        self.records = records
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        record = json.loads(self.records[self.offsets[i]:self.offsets[i + 1]].tobytes())
+        return Document(**record)
+
+    def __iter__(self) -> Iterator[Document]:
+        return (self[i] for i in range(len(self)))
+
+
+def atomic_write(path: str, text: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class VersionFile:
+    """
+    A file holding one version string, re-read only when it changes.
+
+    Each read is a stat(); the file is opened again only when its inode,
+    modification time or size differ from the last read, so callers can
+    check for a new version on every request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._cached: Optional[Tuple[Tuple[int, int, int], Optional[str]]] = None
+
+    def read(self) -> Optional[str]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._cached is None or self._cached[0] != key:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._cached = (key, f.read().strip() or None)
+            except FileNotFoundError:
+                return None
+        return self._cached[1]
+
+
+def current_version(directory: str) -> Optional[str]:
+    """Version of the index currently being served from `directory`, or None if none was exported."""
+    try:
+        with open(os.path.join(directory, CURRENT), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def export_serving_index(
+    directory: str,
+    version: str,
+    ids: List[str],
+    embeddings: np.ndarray,
+    texts: List[str],
+    metadatas: List[dict],
+    manifest: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Write a read-only snapshot of the index that serving processes memory-map:
+    embeddings, documents and their BM25 index.
+
+    Each version goes into its own subdirectory; CURRENT is switched to it
+    only once every file is written, and older versions are removed. Processes
+    still mapping a removed version keep reading it until they reload.
+    Returns the path of the exported version.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, version)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    np.save(os.path.join(path, EMBEDDINGS), matrix)
+    np.save(os.path.join(path, SQUARED_NORMS), np.einsum("ij,ij->i", matrix, matrix))
+
+    offsets = [0]
+    with open(os.path.join(path, RECORDS), 'wb') as f:
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            record = json.dumps(
+                {"id": doc_id, "page_content": text or "", "metadata": metadata or {}},
+                ensure_ascii=False
+            ).encode("utf-8")
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(os.path.join(path, OFFSETS), np.asarray(offsets, dtype=np.int64))
+
+    BM25Index([
+        Document(id=doc_id, page_content=text or "", metadata=metadata or {})
+        for doc_id, text, metadata in zip(ids, texts, metadatas)
+    ], version=version).save_arrays(path)
+
+    manifest = {
+        **(manifest or {}),
+        "version": version,
+        "count": len(ids),
+        "dimension": int(matrix.shape[1]) if len(ids) else 0,
+    }
+    atomic_write(os.path.join(path, MANIFEST), json.dumps(manifest))
+    atomic_write(os.path.join(directory, CURRENT), version)
+
+    for name in os.listdir(directory):
+        other = os.path.join(directory, name)
+        if name != version and os.path.isdir(other):
+            shutil.rmtree(other, ignore_errors=True)
+    return path
+
+
+def load_serving_index(directory: str) -> Optional[Tuple[Dict[str, Any], np.ndarray, np.ndarray, MappedDocuments]]:
+    """
+    Memory-map the current exported version: (manifest, embeddings, squared_norms, documents).
+
+    Returns None if nothing was exported yet.
+    """
+    version = current_version(directory)
+    if version is None:
+        return None
+    path = os.path.join(directory, version)
+    with open(os.path.join(path, MANIFEST), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest["count"] == 0:
+        documents = MappedDocuments(np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64))
+        return manifest, np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32), documents
+
+    matrix = np.load(os.path.join(path, EMBEDDINGS), mmap_mode="r")
+    squared_norms = np.load(os.path.join(path, SQUARED_NORMS), mmap_mode="r")
+    offsets = np.load(os.path.join(path, OFFSETS), mmap_mode="r")
+    records = np.memmap(os.path.join(path, RECORDS), dtype=np.uint8, mode="r")
+    return manifest, matrix, squared_norms, MappedDocuments(records, offsets)
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from app.chunking import SENTENCE_END
+from app.config import get_settings
+from app.tokens import count_tokens
+
+
+class SessionNotFound(KeyError):
+    """A session ID the server never issued, or whose session was deleted or evicted."""
+
+
+def new_session_id() -> str:
+    """An unguessable session ID; holding it is what grants access to the session."""
+    return secrets.token_urlsafe(32)
+
+
+def _trim_to_budget(text: str, token_budget: int) -> str:
+    """Drop the oldest sentences (then characters) of `text` until it fits the token budget."""
+    sentences = SENTENCE_END.split(text)
+    while len(sentences) > 1 and count_tokens(" ".join(sentences)) > token_budget:
+        sentences.pop(0)
+    text = " ".join(sentences)
+    while text and count_tokens(text) > token_budget:
+        text = text[len(text) // 4 + 1:]
+    return text
+
+
+class Session:
+    """
+    State of one multi-turn analysis: the user's turns, the documents
+    retrieved so far (most relevant to the latest turns first) and a running
+    summary of the earlier turns.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        turns: Optional[List[str]] = None,
+        document_ids: Optional[List[str]] = None,
+        summary: str = "",
+        created_at: Optional[float] = None,
+        updated_at: Optional[float] = None
+    ):
+        self.session_id = session_id
+        self.turns = turns or []
+        self.document_ids = document_ids or []
+        self.summary = summary
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+
+    def merge_documents(self, new_ids: List[str], max_documents: int) -> List[str]:
+        """Documents for the next turn: its own retrievals, then earlier ones, up to `max_documents`."""
+        merged = list(dict.fromkeys([*new_ids, *self.document_ids]))
+        return merged[:max_documents]
+
+    def question(self, user_message: str) -> str:
+        """The prompt's question for a new turn: the summary of earlier turns, then the new message."""
+        if not self.summary:
+            return user_message
+        return (
+            f"Earlier in this conversation, the user shared:\n{self.summary}\n\n"
+            f"Their new message:\n{user_message}"
+        )
+
+    def add_turn(self, user_message: str, document_ids: List[str], max_turns: int, summary_token_budget: int):
+        """Record a completed turn and fold it into the running summary."""
+        self.turns = [*self.turns, user_message][-max_turns:]
+        self.document_ids = document_ids
+        self.summary = _trim_to_budget(f"{self.summary} {user_message}".strip(), summary_token_budget)
+        self.updated_at = time.time()
+
+
+class SessionStore:
+    """
+    Bounded store of analysis sessions, persisted to the backend's own
+    SQLite file.
+
+    Recently used sessions are kept in an in-memory LRU of at most
+    `max_sessions`; every session is written through to the
+    `analysis_sessions` table so it survives restarts and is visible to
+    other workers (a session updated elsewhere is reloaded). The file is
+    opened on first use. Sessions idle for longer than `idle_ttl_seconds`
+    are evicted from memory and disk, and periodic sweeps keep at most
+    `max_sessions` (the most recently used) on disk.
+    """
+
+    # Minimum seconds between sweeps for idle sessions
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_sessions: int = 1000,
+        idle_ttl_seconds: float = 86400.0
+    ):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+
+        self._memory: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_sweep = 0.0
+        # One lock per session in use, so turns of a session run one at a time
+        self._turn_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite file and create the table on first use."""
+        if not self.path:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_sessions ("
+                "id TEXT PRIMARY KEY, turns TEXT NOT NULL, document_ids TEXT NOT NULL, "
+                "summary TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS analysis_sessions_updated_at ON analysis_sessions (updated_at)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _expired(self, updated_at: float, now: float) -> bool:
+        return now - updated_at > self.idle_ttl_seconds
+
+    def _remember(self, session: Session):
+        """Insert into the LRU, evicting the least recently used sessions from memory. Caller holds the lock."""
+        self._memory[session.session_id] = session
+        self._memory.move_to_end(session.session_id)
+        while len(self._memory) > self.max_sessions:
+            self._memory.popitem(last=False)
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Lock serializing the turns of one session."""
+        lock = self._turn_locks.get(session_id)
+        if lock is None:
+            lock = self._turn_locks[session_id] = asyncio.Lock()
+        return lock
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """The session, or None if it does not exist or has been idle too long."""
+        now = time.time()
+        with self._lock:
+            session = self._memory.get(session_id)
+            db = self._connect()
+            if db is not None:
+                row = db.execute(
+                    "SELECT turns, document_ids, summary, created_at, updated_at "
+                    "FROM analysis_sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    session = None
+                elif session is None or row[4] > session.updated_at:
+                    session = Session(session_id, json.loads(row[0]), json.loads(row[1]), row[2], row[3], row[4])
+
+            if session is None or self._expired(session.updated_at, now):
+                self._memory.pop(session_id, None)
+                return None
+            self._remember(session)
+            return session
+
+    def save(self, session: Session):
+        with self._lock:
+            self._remember(session)
+            db = self._connect()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO analysis_sessions "
+                    "(id, turns, document_ids, summary, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (session.session_id, json.dumps(session.turns), json.dumps(session.document_ids),
+                     session.summary, session.created_at, session.updated_at)
+                )
+                db.commit()
+        if time.time() - self._last_sweep > self.SWEEP_INTERVAL:
+            self.evict_idle()
+
+    def delete(self, session_id: str) -> bool:
+        """Forget a session. Returns whether it existed."""
+        with self._lock:
+            existed = self._memory.pop(session_id, None) is not None
+            db = self._connect()
+            if db is not None:
+                existed = db.execute("DELETE FROM analysis_sessions WHERE id = ?", (session_id,)).rowcount > 0 or existed
+                db.commit()
+        return existed
+
+    def evict_idle(self) -> int:
+        """
+        Remove sessions idle for longer than the TTL from memory and disk,
+        then the least recently used sessions beyond `max_sessions` from
+        disk. Returns how many were removed.
+        """
+        now = time.time()
+        with self._lock:
+            self._last_sweep = now
+            idle = [sid for sid, session in self._memory.items() if self._expired(session.updated_at, now)]
+            for sid in idle:
+                del self._memory[sid]
+            removed = len(idle)
+            db = self._connect()
+            if db is not None:
+                removed = max(removed, db.execute(
+                    "DELETE FROM analysis_sessions WHERE updated_at < ?", (now - self.idle_ttl_seconds,)
+                ).rowcount)
+                removed += db.execute(
+                    "DELETE FROM analysis_sessions WHERE id IN ("
+                    "SELECT id FROM analysis_sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,)
+                ).rowcount
+                db.commit()
+        return removed
+
+    async def _off_loop(self, method, *args):
+        """Run a store method in a worker thread when it touches SQLite, inline otherwise."""
+        if not self.path:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    async def aget(self, session_id: str) -> Optional[Session]:
+        """`get` without blocking the event loop on SQLite."""
+        return await self._off_loop(self.get, session_id)
+
+    async def asave(self, session: Session):
+        """`save` without blocking the event loop on SQLite."""
+        await self._off_loop(self.save, session)
+
+    async def adelete(self, session_id: str) -> bool:
+        """`delete` without blocking the event loop on SQLite."""
+        return await self._off_loop(self.delete, session_id)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._memory), "max_size": self.max_sessions}
+
+
+@lru_cache(maxsize=None)
+def get_session_store() -> SessionStore:
+    """The process-wide session store, created on first use."""
+    settings = get_settings()
+    return SessionStore(
+        path=settings.session_db_file,
+        max_sessions=settings.session_max_sessions,
+        idle_ttl_seconds=settings.session_idle_ttl_seconds
+    )
@@ -0,0 +1,103 @@
+import asyncio
+import weakref
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+from app.metrics import COALESCED
+
+
+T = TypeVar("T")
+
+# The future each caller waits on (from asyncio.shield) -> the task computing the result
+_waiting_on: "weakref.WeakKeyDictionary[asyncio.Future, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+
+def computing_task(waiter: Optional[asyncio.Future]) -> Optional[asyncio.Task]:
+    """
+    The in-flight computation a caller of `SingleFlight.do` or `do_many` is
+    waiting on, given the future it is blocked on; None for any other future.
+    Lets a profiler of the caller's task follow the work into the shared task.
+    """
+    if waiter is None:
+        return None
+    return _waiting_on.get(waiter)
+
+
+async def _shielded(task: "asyncio.Task[T]") -> T:
+    waiter = asyncio.shield(task)
+    _waiting_on[waiter] = task
+    return await waiter
+
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace and trim, so resubmitted stories share a key."""
+    return " ".join(text.split())
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async calls onto one in-flight computation.
+
+    The first caller for a key starts the computation as its own task; later
+    callers with the same key await that task instead of starting another,
+    and every caller gets its result or its exception. The computation is
+    shielded from callers being cancelled (e.g. a client disconnecting), so
+    the others still get the result. Once it finishes, the key is released:
+    this is deduplication of concurrent work, not a cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Result of `compute()` for `key`, and whether it was shared with an in-flight call."""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            COALESCED.inc(kind=self.name)
+        else:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        return await _shielded(task), shared
+
+    async def do_many(self, keys: List[Hashable], compute: Callable[[List[Hashable]], Awaitable[List[T]]]) -> List[T]:
+        """
+        Results for many keys, in order. Keys already in flight join those
+        calls; the others are computed together by one `compute(missing)`
+        call, which returns their results in order, and are in flight for
+        any concurrent `do` or `do_many` until it finishes.
+        """
+        tasks: Dict[Hashable, asyncio.Task] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            task = self._inflight.get(key)
+            if task is not None:
+                COALESCED.inc(kind=self.name)
+                tasks[key] = task
+            else:
+                missing.append(key)
+
+        if missing:
+            batch = asyncio.ensure_future(compute(missing))
+            for i, key in enumerate(missing):
+                task = tasks[key] = asyncio.ensure_future(self._pick(batch, i))
+                self._inflight[key] = task
+                task.add_done_callback(lambda done, key=key: self._release(key, done))
+
+        results = {key: await _shielded(task) for key, task in tasks.items()}
+        return [results[key] for key in keys]
+
+    @staticmethod
+    async def _pick(batch: "asyncio.Future[List[T]]", index: int) -> T:
+        return (await batch)[index]
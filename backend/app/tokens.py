@@ -0,0 +1,56 @@
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str) -> Optional["tiktoken.Encoding"]:
+    """Load a tiktoken encoding, or None if it is unavailable (e.g. offline on first use)."""
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, encoding: str = "o200k_base") -> int:
+    """Count tokens in `text` (gpt-4o's encoding by default), estimating if the encoding is unavailable."""
+    enc = get_encoding(encoding)
+    if enc is None:
+        return len(text) // 3 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def split_tokens(text: str, max_tokens: int, encoding: str = "o200k_base") -> List[str]:
+    """
+    Split `text` into consecutive pieces of at most `max_tokens` tokens each,
+    without surrounding whitespace (by character estimate if the encoding is
+    unavailable).
+    """
+    enc = get_encoding(encoding)
+    if enc is None:
+        # The longest pieces whose estimate (len // 3 + 1) is within max_tokens
+        size = max(1, 3 * max_tokens - 3)
+        pieces = [text[start:start + size] for start in range(0, len(text), size)]
+    else:
+        tokens = enc.encode(text, disallowed_special=())
+        _, offsets = enc.decode_with_offsets(tokens)
+        offsets.append(len(text))
+        pieces = []
+        start = 0
+        while start < len(tokens):
+            # A window of max_tokens tokens can re-encode to a few more once cut out, so shrink until it fits
+            end = min(start + max_tokens, len(tokens))
+            while end > start + 1 and count_tokens(text[offsets[start]:offsets[end]].strip(), encoding) > max_tokens:
+                end -= 1
+            pieces.append(text[offsets[start]:offsets[end]])
+            start = end
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+def count_tokens_batch(texts: List[str], encoding: str = "o200k_base") -> int:
+    """Total token count of many texts."""
+    enc = get_encoding(encoding)
+    if enc is None:
+        return sum(len(text) // 3 + 1 for text in texts)
+    return sum(len(tokens) for tokens in enc.encode_batch(texts, disallowed_special=()))
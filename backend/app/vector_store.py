@@ -1,24 +1,257 @@
+import asyncio
+import logging
 import os
-from typing import List, Optional
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
+import uuid
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
 from langchain_core.documents import Document
-from app.config import settings
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore as LangChainVectorStore
+from app.chunking import aggregate_chunk_results, mean_embedding, split_story
+from app.config import Settings, get_settings
+from app.embedding_cache import CachedEmbeddings
+from app.embeddings import create_embeddings, embedding_signature
+from app.http_clients import get_http_clients
+from app.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.metrics import STAGE_SECONDS
+from app.serving_index import CURRENT, VersionFile, atomic_write, export_serving_index, load_serving_index
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+logger = logging.getLogger(__name__)
+
+
+# Backends that search an in-process matrix rather than Chroma
+IN_MEMORY_BACKENDS = ("numpy", "mmap")
+
+# Metadata field holding the display name of a document, per category
+NAME_FIELDS = {
+    "player_typology": "player_type",
+    "abuse_flavor": "abuse_flavor",
+    "trauma": "trauma_type",
+    "vulnerability": "vulnerability_type",
+}
+
+
+def document_name(metadata: dict) -> str:
+    """Display name of a document, whatever its category."""
+    field = NAME_FIELDS.get(metadata.get("category"), "player_type")
+    return metadata.get(field) or "Unknown"
+
+
+class NumpyIndex(LangChainVectorStore):
+    """
+    Exact in-memory search over every embedding in a Chroma collection.
+
+    All embeddings are loaded into one contiguous float32 matrix, so a top-k
+    query is a single matrix-vector product plus argpartition. Scores are
+    squared L2 distances, the same as Chroma's default space, so results are
+    interchangeable with the Chroma backend. The index is read-only: documents
+    are still written to Chroma and the index is reloaded from it.
+
+    The matrix may be a read-only memory map (see from_serving_index), in
+    which case worker processes share its pages through the OS page cache.
+    """
+
+    def __init__(self, embedding: Embeddings, matrix: np.ndarray, documents: Sequence[Document],
+                 squared_norms: Optional[np.ndarray] = None, version: Optional[str] = None,
+                 manifest: Optional[dict] = None):
+        self._embedding = embedding
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.squared_norms = (
+            squared_norms if squared_norms is not None
+            else np.einsum("ij,ij->i", self.matrix, self.matrix)
+        )
+        self.documents = documents
+        self.version = version
+        self.manifest = manifest or {}
+
+    @classmethod
+    def from_chroma(cls, chroma: "Chroma", embedding: Embeddings) -> "NumpyIndex":
+        """Load every embedding, document and metadata entry from a Chroma collection."""
+        data = chroma.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = data.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        else:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+        documents = [
+            Document(id=doc_id, page_content=text or "", metadata=metadata or {})
+            for doc_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+        ]
+        return cls(embedding, matrix, documents)
+
+    @classmethod
+    def from_serving_index(cls, directory: str, embedding: Embeddings) -> Optional["NumpyIndex"]:
+        """Memory-map the index exported to `directory`, or None if there is none."""
+        loaded = load_serving_index(directory)
+        if loaded is None:
+            return None
+        manifest, matrix, squared_norms, documents = loaded
+        return cls(embedding, matrix, documents, squared_norms=squared_norms, version=manifest["version"], manifest=manifest)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _top_k(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, distances) of the k nearest rows for each query, nearest first."""
+        k = min(k, len(self.documents))
+        if k <= 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty
+
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        distances = (
+            self.squared_norms[np.newaxis, :]
+            - 2.0 * (queries @ self.matrix.T)
+            + np.einsum("ij,ij->i", queries, queries)[:, np.newaxis]
+        )
+        np.maximum(distances, 0.0, out=distances)
+
+        if k < distances.shape[1]:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        return (
+            np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_distances, order, axis=1),
+        )
+
+    def similarity_search_by_vectors_with_score(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Batched exact search: one matrix-matrix product for every query."""
+        if not embeddings:
+            return []
+        indices, distances = self._top_k(np.asarray(embeddings, dtype=np.float32), k)
+        return [
+            [(self.documents[i], float(d)) for i, d in zip(row_indices, row_distances)]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vectors_with_score([embedding], k=k)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(self._embedding.embed_query(query), k=k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("NumpyIndex is read-only; add documents through Chroma and reload")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None, **kwargs: Any) -> "NumpyIndex":
+        raise NotImplementedError("Use NumpyIndex.from_chroma")
 
 
 class VectorStore:
     """Manages the vector database for manipulation patterns."""
 
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=settings.openai_api_key
-        )
-        self.persist_directory = settings.chroma_persist_directory
+    def __init__(self, settings: Optional[Settings] = None, embeddings: Optional[Embeddings] = None):
+        """
+        Cheap to construct: the embedding client is built on first use and
+        Chroma is opened by initialize(). Pass `settings` or `embeddings`
+        (e.g. a local or stub provider) to override the configured ones.
+        """
+        self.settings = settings or get_settings()
+        self.persist_directory = self.settings.chroma_persist_directory
+        self.embedding_provider = self.settings.embedding_provider
+        self._provider = embeddings
+        # HTTP client generation a built OpenAI provider holds clients of (None if it needs none)
+        self._provider_http_generation: Optional[int] = None
+        self._embeddings: Optional[CachedEmbeddings] = None
         self.collection_name = "manipulation_patterns"
-        self._vector_store: Optional[Chroma] = None
+        self.backend = self.settings.vector_backend
+        self._vector_store: Optional["Chroma"] = None
+        self._numpy_index: Optional[NumpyIndex] = None
+        self._lexical_index: Optional[BM25Index] = None
+        self.retrieval_mode = self.settings.retrieval_mode
+        self._documents: Optional[Tuple[Optional[str], Sequence[Document]]] = None
+        self._metadatas: Optional[Tuple[Optional[str], List[dict]]] = None
+        self._catalog: Optional[Tuple[Optional[str], Dict[str, List[str]]]] = None
+        self._positions_by_id: Optional[Tuple[Optional[str], Dict[str, int]]] = None
+        # Checked on every request, so read through a stat-validated cache
+        self._index_version_file = VersionFile(self.index_version_path)
+        self._serving_version = VersionFile(os.path.join(self.serving_index_dir, CURRENT))
+
+        if self.backend not in ("chroma", *IN_MEMORY_BACKENDS):
+            raise ValueError(f"Unknown vector backend: {self.backend!r} (expected 'chroma', 'numpy' or 'mmap')")
+        if self.retrieval_mode not in ("vector", "hybrid", "lexical"):
+            raise ValueError(f"Unknown retrieval mode: {self.retrieval_mode!r} (expected 'vector', 'hybrid' or 'lexical')")
+        if self.settings.story_chunk_aggregation not in ("max", "rrf"):
+            raise ValueError(
+                f"Unknown chunk aggregation: {self.settings.story_chunk_aggregation!r} (expected 'max' or 'rrf')"
+            )
+
+    @property
+    def provider(self) -> Embeddings:
+        """The embedding provider, built from settings on first use unless one was injected."""
+        if self._provider is None or self._provider_is_stale():
+            self._provider = create_embeddings(self.embedding_provider, self.settings)
+            self._provider_http_generation = (
+                get_http_clients().generation if self.embedding_provider == "openai" else None
+            )
+        return self._provider
+
+    def _provider_is_stale(self) -> bool:
+        """Whether the built provider holds HTTP clients closed since (e.g. by a previous app lifespan)."""
+        return (
+            self._provider_http_generation is not None
+            and self._provider_http_generation != get_http_clients().generation
+        )
+
+    @property
+    def embedding_signature(self) -> Tuple[str, Optional[int]]:
+        return embedding_signature(self.embedding_provider, self.provider)
+
+    @property
+    def embeddings(self) -> CachedEmbeddings:
+        """The embedding provider behind the query embedding cache."""
+        if self._embeddings is not None and self._provider_is_stale():
+            # Keep the cached vectors, swap in a provider with open clients
+            self._embeddings.embeddings = self.provider
+        if self._embeddings is None:
+            self._embeddings = CachedEmbeddings(
+                self.provider,
+                max_size=self.settings.embedding_cache_size,
+                ttl_seconds=self.settings.embedding_cache_ttl_seconds,
+                # Local providers are faster to recompute than to read back from disk
+                persist_path=(
+                    os.path.join(self.persist_directory, "query_embedding_cache.sqlite3")
+                    if self.settings.embedding_cache_persist and self.embedding_provider == "openai" else None
+                ),
+                max_disk_rows=self.settings.embedding_cache_disk_max_rows
+            )
+        return self._embeddings
 
     def initialize(self):
         """Initialize or load the vector store."""
+        if self.backend == "mmap":
+            # Read-only serving: no Chroma client, just the exported index
+            self._load_mmap_index()
+            self._load_lexical_index()
+            print(f"✓ Vector store initialized (serving index: {self.serving_index_dir}, backend: mmap)")
+            return self
+
+        # Imported here: Chroma is slow to import and only needed once the store is opened
+        from langchain_chroma import Chroma
+
         os.makedirs(self.persist_directory, exist_ok=True)
 
         self._vector_store = Chroma(
@@ -31,43 +264,507 @@ class VectorStore:
         if self._vector_store is None:
             raise RuntimeError("Failed to initialize vector store")
 
-        print(f"✓ Vector store initialized (collection: {self.collection_name})")
+        self._check_embedding_signature()
+
+        if self.backend == "numpy":
+            self._load_numpy_index()
+        self._load_lexical_index()
+
+        print(f"✓ Vector store initialized (collection: {self.collection_name}, backend: {self.backend})")
         return self
 
+    def _check_embedding_signature(self):
+        """
+        Record which embedding provider and dimension the collection is built
+        with, and refuse to use a collection built with a different one.
+        """
+        collection = self._vector_store._collection
+        provider, dimension = self.embedding_signature
+        metadata = dict(collection.metadata or {})
+
+        recorded = metadata.get("embedding_provider")
+        recorded_dimension = metadata.get("embedding_dimension")
+        if recorded is None and collection.count() > 0:
+            # Collections ingested before providers were recorded: check the stored vector size
+            sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+            recorded_dimension = len(sample[0]) if sample is not None and len(sample) else None
+
+        self._verify_embedding_signature(f"Collection '{self.collection_name}'", recorded, recorded_dimension)
+
+        if recorded is None:
+            metadata["embedding_provider"] = provider
+            if dimension is not None:
+                metadata["embedding_dimension"] = dimension
+            collection.modify(metadata=metadata)
+
+    def _verify_embedding_signature(self, source: str, recorded: Optional[str], recorded_dimension: Optional[int]):
+        """Raise if an index recorded as built with `recorded` embeddings does not match the configured provider."""
+        provider, dimension = self.embedding_signature
+        if recorded is not None and recorded != provider:
+            raise RuntimeError(
+                f"{source} was built with embeddings '{recorded}' "
+                f"but EMBEDDING_PROVIDER gives '{provider}'. Re-ingest with --clear or change the provider."
+            )
+        if recorded_dimension and dimension is not None and recorded_dimension != dimension:
+            raise RuntimeError(
+                f"{source} holds {recorded_dimension}-dimensional embeddings "
+                f"but '{provider}' produces {dimension}. Re-ingest with --clear or change the provider."
+            )
+
+    @property
+    def serving_index_dir(self) -> str:
+        return os.path.join(self.persist_directory, "serving_index")
+
+    def export_serving_index(self):
+        """
+        Export the collection for VECTOR_BACKEND=mmap: embeddings and documents
+        in flat files that every API worker memory-maps, so the OS shares one
+        copy of them across processes.
+        """
+        if not self._vector_store:
+            raise ValueError(self._not_writable_message)
+
+        data = self._vector_store.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = data.get("embeddings")
+        matrix = np.zeros((0, 0), dtype=np.float32) if embeddings is None or len(embeddings) == 0 else embeddings
+        provider, dimension = self.embedding_signature
+        export_serving_index(
+            self.serving_index_dir,
+            self.index_version or uuid.uuid4().hex,
+            data["ids"],
+            matrix,
+            data["documents"],
+            data["metadatas"],
+            manifest={"embedding_provider": provider, "embedding_dimension": dimension}
+        )
+        print(f"✓ Exported {len(data['ids'])} embeddings to the serving index")
+
+    def _load_mmap_index(self):
+        """Memory-map the exported serving index."""
+        index = NumpyIndex.from_serving_index(self.serving_index_dir, self.embeddings)
+        if index is None:
+            raise RuntimeError(
+                f"No serving index in {self.serving_index_dir}. "
+                "Run scripts/ingest_data.py to export one before serving with VECTOR_BACKEND=mmap."
+            )
+        self._verify_embedding_signature(
+            f"Serving index {index.version}",
+            index.manifest.get("embedding_provider"),
+            index.manifest.get("embedding_dimension")
+        )
+        self._numpy_index = index
+        print(f"✓ Memory-mapped {len(index)} embeddings from the serving index")
+
+    def _load_numpy_index(self):
+        """(Re)load the in-memory exact-search index from the Chroma collection."""
+        self._numpy_index = NumpyIndex.from_chroma(self._vector_store, self.embeddings)
+        print(f"✓ Loaded {len(self._numpy_index)} embeddings into the in-memory index")
+
+    @property
+    def lexical_index_path(self) -> str:
+        return os.path.join(self.persist_directory, "bm25_index.json")
+
+    def build_lexical_index(self):
+        """Build the BM25 index from the collection and persist it next to the Chroma data."""
+        index_version, documents = self.collection_documents()
+        self._lexical_index = BM25Index(documents, version=index_version)
+        self._lexical_index.save(self.lexical_index_path)
+        print(f"✓ Built lexical index over {len(documents)} documents")
+
+    def _load_lexical_index(self):
+        """Load the persisted BM25 index, rebuilding it if it is missing or stale."""
+        if self.backend == "mmap":
+            self._load_mapped_lexical_index()
+            return
+        index = BM25Index.load(self.lexical_index_path)
+        if index is None or index.version != self.index_version:
+            self.build_lexical_index()
+        else:
+            self._lexical_index = index
+
+    def _load_mapped_lexical_index(self):
+        """Memory-map the BM25 index exported with the mapped serving index."""
+        index = self._numpy_index
+        self._lexical_index = BM25Index.load_arrays(
+            os.path.join(self.serving_index_dir, index.version), index.documents, version=index.version
+        )
+        if self._lexical_index is None:
+            # Exported before BM25 was part of the export: index the mapped documents in memory
+            logger.warning(f"Serving index {index.version} has no BM25 index; building one in memory")
+            self._lexical_index = BM25Index(index.documents, version=index.version)
+
+    def _refresh_mmap_index(self):
+        """Map the newest serving index if ingest_data.py exported a new one."""
+        if self._numpy_index is None or self._serving_version.read() == self._numpy_index.version:
+            return
+        try:
+            self._load_mmap_index()
+        except (OSError, RuntimeError) as e:
+            # E.g. the version was replaced again while loading; keep serving the mapped one
+            logger.warning(f"Could not reload the serving index ({e}); keeping version {self._numpy_index.version}")
+
+    def _refresh_if_stale(self):
+        """Reload in-memory indexes if another process (e.g. ingest_data.py) re-ingested the data."""
+        if self.backend == "mmap":
+            self._refresh_mmap_index()
+        if self._lexical_index is not None and self._lexical_index.version != self.index_version:
+            self._load_lexical_index()
+            if self.backend == "numpy":
+                self._load_numpy_index()
+
+    @property
+    def _searcher(self) -> LangChainVectorStore:
+        """The store that answers queries for the configured backend."""
+        if not self.is_initialized:
+            raise ValueError("Vector store not initialized. Call initialize() first.")
+
+        if self.backend in IN_MEMORY_BACKENDS:
+            return self._numpy_index
+        return self._vector_store
+
     def add_documents(self, documents: List[Document]):
         """Add documents to the vector store."""
         if not self._vector_store:
-            raise ValueError("Vector store not initialized. Call initialize() first.")
+            raise ValueError(self._not_writable_message)
 
         self._vector_store.add_documents(documents)
+        self._bump_index_version()
+        if self.backend == "numpy":
+            self._load_numpy_index()
+        self.export_serving_index()
         print(f"Added {len(documents)} documents to vector store")
 
-    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
-        """Search for similar documents."""
+    def sync_documents(
+        self,
+        documents: List[Document],
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Make the collection match `documents` exactly, re-embedding as little as possible.
+
+        Documents must carry stable IDs and a `content_hash` metadata entry.
+        New or changed documents are embedded and upserted in batches (see
+        upsert_documents_batched), unchanged ones are skipped, and documents
+        that are no longer present are deleted.
+        """
         if not self._vector_store:
-            raise ValueError("Vector store not initialized. Call initialize() first.")
+            raise ValueError(self._not_writable_message)
+
+        existing = self._vector_store.get(include=["metadatas"])
+        existing_hashes = {
+            doc_id: (metadata or {}).get("content_hash")
+            for doc_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
 
-        return self._vector_store.similarity_search(query, k=k)
+        incoming_ids = {doc.id for doc in documents}
+        new = [doc for doc in documents if doc.id not in existing_hashes]
+        changed = [
+            doc for doc in documents
+            if doc.id in existing_hashes and existing_hashes[doc.id] != doc.metadata.get("content_hash")
+        ]
+        stale = [doc_id for doc_id in existing_hashes if doc_id not in incoming_ids]
+
+        to_upsert = new + changed
+        throughput = None
+        if to_upsert:
+            throughput = self.upsert_documents_batched(to_upsert, batch_size, max_concurrency)
+        if stale:
+            self._vector_store.delete(ids=stale)
+
+        if to_upsert or stale:
+            self._bump_index_version()
+            if self.backend == "numpy":
+                self._load_numpy_index()
+        self._load_lexical_index()
+        if self._serving_version.read() != self.index_version:
+            self.export_serving_index()
+
+        return {
+            "added": len(new),
+            "updated": len(changed),
+            "deleted": len(stale),
+            "unchanged": len(documents) - len(to_upsert),
+            "throughput": throughput,
+        }
+
+    def upsert_documents_batched(
+        self,
+        documents: List[Document],
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ) -> Dict[str, float]:
+        """
+        Embed and upsert documents in batches, several batches in flight at once.
+
+        Rate limits and transient API errors are retried with backoff instead
+        of aborting the ingest. Each batch is written to Chroma as soon as it
+        is embedded, so an interrupted run resumes where it stopped: the next
+        sync_documents call sees those documents as unchanged. Returns
+        docs/sec and tokens/sec stats. Must be called outside a running event loop.
+        """
+        if not self._vector_store:
+            raise ValueError(self._not_writable_message)
+
+        collection = self._vector_store._collection
+
+        async def write_batch(start: int, vectors: List[List[float]]):
+            batch = documents[start:start + len(vectors)]
+            await asyncio.to_thread(
+                collection.upsert,
+                ids=[doc.id for doc in batch],
+                embeddings=vectors,
+                documents=[doc.page_content for doc in batch],
+                metadatas=[doc.metadata for doc in batch]
+            )
+            print(f"  ✓ Upserted documents {start + 1}-{start + len(batch)} of {len(documents)}")
+
+        from app.batch_embedding import embed_in_batches
+
+        return asyncio.run(embed_in_batches(
+            self.embeddings,
+            [doc.page_content for doc in documents],
+            write_batch,
+            batch_size=batch_size or self.settings.ingest_batch_size,
+            max_concurrency=max_concurrency or self.settings.ingest_max_concurrency,
+            max_retries=self.settings.ingest_max_retries
+        ))
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        """Search for similar documents."""
+        return self._searcher.similarity_search(query, k=k)
 
     def similarity_search_with_score(self, query: str, k: int = 4) -> List[tuple]:
         """Search for similar documents with relevance scores."""
-        if not self._vector_store:
+        return self._searcher.similarity_search_with_score(query, k=k)
+
+    def lexical_search(self, query: str, k: int = 4) -> List[Document]:
+        """BM25 keyword search; needs no embedding."""
+        if self._lexical_index is None:
             raise ValueError("Vector store not initialized. Call initialize() first.")
 
-        return self._vector_store.similarity_search_with_score(query, k=k)
+        with STAGE_SECONDS.time(stage="lexical_search"):
+            return [doc for doc, _ in self._lexical_index.search_with_score(query, k=k)]
+
+    async def aretrieve(self, query: str, k: int = 4) -> Tuple[Optional[List[float]], List[Document]]:
+        """
+        Retrieve documents for a query according to RETRIEVAL_MODE.
+
+        - "vector": embedding search only
+        - "lexical": BM25 only, no embedding call
+        - "hybrid": vector and BM25 rankings fused with reciprocal-rank fusion;
+          if the embeddings API errors or exceeds EMBEDDING_TIMEOUT_SECONDS,
+          falls back to BM25 alone
+
+        Stories longer than STORY_CHUNK_MIN_TOKENS are split into chunks
+        that are embedded in one batched request and searched together;
+        the per-chunk results are combined per STORY_CHUNK_AGGREGATION, so a
+        pattern described in one paragraph of a long story is not diluted by
+        the rest of it. BM25 still scores the whole story.
+
+        Returns the query embedding (None when it was not computed; for a
+        chunked story, the normalized mean of its chunk embeddings) and the documents.
+        """
+        self._refresh_if_stale()
+
+        if self.retrieval_mode == "lexical":
+            return None, self.lexical_search(query, k=k)
+
+        chunks = self._split(query)
+        try:
+            with STAGE_SECONDS.time(stage="embedding"):
+                embeddings = await asyncio.wait_for(
+                    self.embeddings.aembed_queries(chunks) if len(chunks) > 1 else self._aembed_one(query),
+                    timeout=self.settings.embedding_timeout_seconds
+                )
+        except Exception as e:
+            if self.retrieval_mode == "vector":
+                raise
+            logger.warning(f"Query embedding failed ({type(e).__name__}: {e}); using lexical retrieval only")
+            return None, self.lexical_search(query, k=k)
+
+        if len(embeddings) == 1:
+            return embeddings[0], await self.aretrieve_by_vector(query, embeddings[0], k=k)
+        return mean_embedding(embeddings), await self._aretrieve_by_chunk_vectors(query, embeddings, k=k)
+
+    def _split(self, query: str) -> List[str]:
+        """The chunks a query is embedded as: the query itself unless it is a long story."""
+        return split_story(
+            query,
+            chunk_tokens=self.settings.story_chunk_tokens,
+            min_tokens=self.settings.story_chunk_min_tokens,
+            max_chunks=self.settings.story_max_chunks
+        )
+
+    async def _aembed_one(self, query: str) -> List[List[float]]:
+        return [await self.embeddings.aembed_query(query)]
+
+    def _aggregate_chunks(self, results: List[List[Tuple[Document, float]]], k: int) -> List[Document]:
+        return aggregate_chunk_results(
+            results, k=k, method=self.settings.story_chunk_aggregation, rrf_k=self.settings.rrf_k
+        )
+
+    async def _aretrieve_by_chunk_vectors(self, query: str, embeddings: List[List[float]], k: int = 4) -> List[Document]:
+        """Retrieve per RETRIEVAL_MODE for a story embedded as several chunks."""
+        fetch_k = k if self.retrieval_mode == "vector" else max(k, self.settings.retrieval_fetch_k)
+        with STAGE_SECONDS.time(stage="vector_search"):
+            results = await self._asearch_by_vectors(embeddings, fetch_k)
+        with STAGE_SECONDS.time(stage="fusion"):
+            vector_docs = self._aggregate_chunks(results, fetch_k)
+
+        if self.retrieval_mode == "vector":
+            return vector_docs
+
+        lexical_docs = self.lexical_search(query, k=fetch_k)
+        with STAGE_SECONDS.time(stage="fusion"):
+            fused = reciprocal_rank_fusion([vector_docs, lexical_docs], k=k, rrf_k=self.settings.rrf_k)
+        return [doc for doc, _ in fused]
+
+    async def aretrieve_by_vector(self, query: str, embedding: Optional[List[float]], k: int = 4) -> List[Document]:
+        """Retrieve per RETRIEVAL_MODE with an already computed query embedding (unused in lexical mode)."""
+        if self.retrieval_mode == "lexical" or embedding is None:
+            return self.lexical_search(query, k=k)
+
+        if self.retrieval_mode == "vector":
+            return await self.asimilarity_search_by_vector(embedding, k=k)
+
+        fetch_k = max(k, self.settings.retrieval_fetch_k)
+        vector_docs = await self.asimilarity_search_by_vector(embedding, k=fetch_k)
+        lexical_docs = self.lexical_search(query, k=fetch_k)
+        with STAGE_SECONDS.time(stage="fusion"):
+            fused = reciprocal_rank_fusion([vector_docs, lexical_docs], k=k, rrf_k=self.settings.rrf_k)
+        return [doc for doc, _ in fused]
+
+    async def asimilarity_search(self, query: str, k: int = 4) -> List[Document]:
+        """Search for similar documents without blocking the event loop."""
+        results = await self.asimilarity_search_with_score(query, k=k)
+        return [doc for doc, _ in results]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4) -> List[tuple]:
+        """
+        Search for similar documents with relevance scores without blocking the event loop.
+
+        The query embedding uses the native async OpenAI client; the Chroma
+        query itself is synchronous, so it runs in a worker thread.
+        """
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.asimilarity_search_by_vector_with_score(embedding, k=k)
+
+    async def asimilarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Search with an already computed query embedding without blocking the event loop."""
+        results = await self.asimilarity_search_by_vector_with_score(embedding, k=k)
+        return [doc for doc, _ in results]
+
+    async def asimilarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[tuple]:
+        """Search with an already computed query embedding, returning relevance scores."""
+        searcher = self._searcher
+
+        with STAGE_SECONDS.time(stage="vector_search"):
+            # The in-memory index answers in microseconds; only Chroma needs a thread
+            if self.backend in IN_MEMORY_BACKENDS:
+                return searcher.similarity_search_by_vector_with_relevance_scores(embedding, k)
+
+            return await asyncio.to_thread(
+                searcher.similarity_search_by_vector_with_relevance_scores,
+                embedding,
+                k
+            )
+
+    async def abatch_similarity_search(
+        self, queries: List[str], k: int = 4
+    ) -> Tuple[List[Optional[List[float]]], List[List[Document]]]:
+        """
+        Search for many queries at once.
+
+        All queries (the chunks of long stories, as in aretrieve) are
+        embedded in one batched request and searched together (one matrix
+        product for the numpy backend, one collection query for Chroma),
+        then fused with BM25 per RETRIEVAL_MODE as in aretrieve.
+        Returns the query embeddings (None where not computed) and the
+        documents for each query, in input order.
+        """
+        if not queries:
+            return [], []
+        self._refresh_if_stale()
+
+        if self.retrieval_mode == "lexical":
+            return [None] * len(queries), [self.lexical_search(query, k=k) for query in queries]
+
+        chunked = [self._split(query) for query in queries]
+        try:
+            with STAGE_SECONDS.time(stage="batch_embedding"):
+                chunk_embeddings = await self.embeddings.aembed_queries([chunk for chunks in chunked for chunk in chunks])
+        except Exception as e:
+            if self.retrieval_mode == "vector":
+                raise
+            logger.warning(f"Batch embedding failed ({type(e).__name__}: {e}); using lexical retrieval only")
+            return [None] * len(queries), [self.lexical_search(query, k=k) for query in queries]
+
+        fetch_k = k if self.retrieval_mode == "vector" else max(k, self.settings.retrieval_fetch_k)
+        with STAGE_SECONDS.time(stage="batch_vector_search"):
+            chunk_results = await self._asearch_by_vectors(chunk_embeddings, fetch_k)
+
+        # Regroup the flat chunk results by query
+        embeddings: List[Optional[List[float]]] = []
+        vector_rankings: List[List[Document]] = []
+        start = 0
+        for chunks in chunked:
+            end = start + len(chunks)
+            if len(chunks) == 1:
+                embeddings.append(chunk_embeddings[start])
+                vector_rankings.append([doc for doc, _ in chunk_results[start]])
+            else:
+                embeddings.append(mean_embedding(chunk_embeddings[start:end]))
+                vector_rankings.append(self._aggregate_chunks(chunk_results[start:end], fetch_k))
+            start = end
+
+        if self.retrieval_mode == "vector":
+            return embeddings, vector_rankings
+
+        return embeddings, [
+            [doc for doc, _ in reciprocal_rank_fusion(
+                [vector_docs, self.lexical_search(query, k=fetch_k)], k=k, rrf_k=self.settings.rrf_k
+            )]
+            for query, vector_docs in zip(queries, vector_rankings)
+        ]
+
+    async def _asearch_by_vectors(self, embeddings: List[List[float]], k: int) -> List[List[Tuple[Document, float]]]:
+        """(document, distance) results for each of a batch of embeddings, from one search."""
+        searcher = self._searcher
+        if self.backend in IN_MEMORY_BACKENDS:
+            return searcher.similarity_search_by_vectors_with_score(embeddings, k=k)
+        return await asyncio.to_thread(self._chroma_batch_search, embeddings, k)
+
+    def _chroma_batch_search(self, embeddings: List[List[float]], k: int) -> List[List[Tuple[Document, float]]]:
+        """Query the Chroma collection once for a batch of embeddings."""
+        results = self._vector_store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(id=doc_id, page_content=text or "", metadata=metadata or {}), distance)
+                for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
 
     def get_retriever(self, search_kwargs: Optional[dict] = None):
         """Get a retriever for the vector store."""
-        if not self._vector_store:
-            raise ValueError("Vector store not initialized. Call initialize() first.")
+        searcher = self._searcher
 
         if search_kwargs is None:
             search_kwargs = {"k": 4}
 
-        return self._vector_store.as_retriever(search_kwargs=search_kwargs)
+        return searcher.as_retriever(search_kwargs=search_kwargs)
 
     def clear(self):
         """Clear all documents from the vector store."""
+        if self.backend == "mmap":
+            raise ValueError(self._not_writable_message)
         print(f"Clearing collection: {self.collection_name}")
 
         if self._vector_store:
@@ -78,6 +775,9 @@ class VectorStore:
                 print(f"Warning: Error deleting collection: {e}")
 
         self._vector_store = None
+        self._numpy_index = None
+        self._lexical_index = None
+        self._bump_index_version()
         print("Reinitializing vector store...")
 
         # Reinitialize after clearing
@@ -89,11 +789,116 @@ class VectorStore:
 
         return self
 
+    @property
+    def index_version_path(self) -> str:
+        return os.path.join(self.persist_directory, "index_version")
+
+    @property
+    def index_version(self) -> Optional[str]:
+        """
+        Opaque version of the indexed data, changed on every ingestion.
+
+        Stored in a file next to the Chroma data so that API processes notice
+        when scripts/ingest_data.py re-ingests the index. With the mmap backend
+        this is the version of the mapped serving index.
+        """
+        if self.backend == "mmap":
+            return self._numpy_index.version if self._numpy_index else self._serving_version.read()
+        return self._index_version_file.read()
+
+    def collection_documents(self) -> Tuple[Optional[str], Sequence[Document]]:
+        """
+        Every document in the collection, with the index version it was read at.
+
+        Read without embedding anything and kept in memory until the index
+        version changes. With the mmap backend this is the memory-mapped
+        sequence itself: documents are decoded when accessed, never all held
+        in process memory.
+        """
+        if not self.is_initialized:
+            raise ValueError("Vector store not initialized. Call initialize() first.")
+
+        if self.backend == "mmap":
+            self._refresh_mmap_index()
+        index_version = self.index_version
+        if self._documents is not None and self._documents[0] == index_version:
+            return self._documents
+
+        if self.backend == "mmap":
+            self._documents = (index_version, self._numpy_index.documents)
+        else:
+            data = self._vector_store.get(include=["documents", "metadatas"])
+            self._documents = (index_version, [
+                Document(id=doc_id, page_content=text or "", metadata=metadata or {})
+                for doc_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+            ])
+        return self._documents
+
+    def collection_metadatas(self) -> Tuple[Optional[str], List[dict]]:
+        """Metadata of every document in the collection (see collection_documents), kept until the version changes."""
+        index_version, documents = self.collection_documents()
+        if self._metadatas is None or self._metadatas[0] != index_version:
+            self._metadatas = (index_version, [doc.metadata for doc in documents])
+        return self._metadatas
+
+    def pattern_catalog(self) -> Tuple[Optional[str], Dict[str, List[str]]]:
+        """
+        Every pattern name in the collection, grouped by category.
+
+        Built from collection_metadatas, so it is served from memory until
+        the index version changes. Returns the index version the catalog was
+        built from and the catalog itself.
+        """
+        index_version, metadatas = self.collection_metadatas()
+        if self._catalog is None or self._catalog[0] != index_version:
+            catalog: Dict[str, set] = {}
+            for metadata in metadatas:
+                catalog.setdefault(metadata.get("category", "unknown"), set()).add(document_name(metadata))
+            self._catalog = (index_version, {category: sorted(names) for category, names in sorted(catalog.items())})
+
+        return self._catalog
+
+    def documents_by_id(self, ids: List[str]) -> List[Document]:
+        """
+        Documents with the given IDs, in that order, from the collection
+        (see collection_documents), looked up by position. IDs no longer in
+        the index (e.g. after a re-ingest) are skipped.
+        """
+        index_version, documents = self.collection_documents()
+        if self._positions_by_id is None or self._positions_by_id[0] != index_version:
+            self._positions_by_id = (index_version, {doc.id: i for i, doc in enumerate(documents) if doc.id})
+        positions = self._positions_by_id[1]
+        return [documents[positions[doc_id]] for doc_id in ids if doc_id in positions]
+
+    def _bump_index_version(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        # Replaced rather than rewritten, so readers see a new inode and re-read it
+        atomic_write(self.index_version_path, uuid.uuid4().hex)
+
+    @property
+    def _not_writable_message(self) -> str:
+        if self.backend == "mmap":
+            return "VECTOR_BACKEND=mmap is read-only; ingest with the chroma or numpy backend"
+        return "Vector store not initialized. Call initialize() first."
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._vector_store is not None or self._numpy_index is not None
+
     @property
     def vector_store(self):
         """Get the underlying vector store."""
         return self._vector_store
 
 
-# Global vector store instance
-vector_store = VectorStore()
+@lru_cache(maxsize=None)
+def get_vector_store() -> VectorStore:
+    """The process-wide vector store (not yet initialized), created on first use."""
+    return VectorStore()
+
+
+def __getattr__(name: str):
+    # `from app.vector_store import vector_store` keeps working, but builds the store lazily
+    if name == "vector_store":
+        return get_vector_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,372 @@
+"""
+Offline load benchmark for the API.
+
+This script:
+1. Ingests the data files into a temporary vector store using local stand-in
+   embeddings (no OpenAI calls)
+2. Runs the FastAPI app in-process with stand-ins for the LLM and the query
+   embeddings, each sleeping for a latency drawn from a configurable distribution
+3. Drives /analyze (with the TEST_CASES stories), /patterns and /health at a
+   configurable concurrency
+4. Reports req/s and p50/p95/p99 latency per endpoint as JSON
+
+Latency distributions are given in milliseconds:
+    fixed:MS            e.g. fixed:50
+    uniform:LO,HI       e.g. uniform:500,1500
+    normal:MEAN,SD      e.g. normal:800,200 (clipped at 0)
+    lognormal:MEDIAN,SIGMA  e.g. lognormal:800,0.5
+
+Response and query embedding caches are disabled unless --cache is given, so
+every /analyze request pays the stand-in latencies.
+
+Usage:
+    python scripts/benchmark.py                                  # Defaults, JSON to stdout
+    python scripts/benchmark.py --concurrency 32 --requests 500 --output bench.json
+    python scripts/benchmark.py --llm-latency lognormal:1200,0.6 --embedding-latency fixed:80
+"""
+
+import sys
+import re
+import math
+import json
+import time
+import random
+import logging
+import shutil
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.config import Settings, get_settings
+from app.embeddings import HashingEmbeddings
+from app.main import app
+from app.rag_chain import RAGChain, get_rag_chain
+from app.vector_store import VectorStore, get_vector_store
+from scripts.ingest_data import ingest_all_data
+from scripts.reporting import git_commit, latency_summary, timestamp
+from scripts.test_rag_queries import TEST_CASES
+
+
+ENDPOINTS = ["analyze", "patterns", "health"]
+
+# The benchmark client's own request logging is not part of what is measured
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Names of the patterns in the prompt context, echoed by the stand-in LLM so findings extraction runs
+CONTEXT_NAME = re.compile(r"^(?:Player Type|Abuse Flavor|Trauma Sign|Vulnerability Type): ([^(\n]+)", re.MULTILINE)
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Parse a latency distribution spec (milliseconds) into a sampler returning seconds."""
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"Invalid latency spec {spec!r}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(rng.gauss(values[0], values[1]), 0.0) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(
+        f"Invalid latency spec {spec!r} (expected fixed:MS, uniform:LO,HI, normal:MEAN,SD or lognormal:MEDIAN,SIGMA)"
+    )
+
+
+class StubEmbeddings(HashingEmbeddings):
+    """Local hashing embeddings; query embeddings sleep for a sampled latency, like an API call."""
+
+    def __init__(self, sample_latency: Callable[[], float], dimension: int = 1024):
+        super().__init__(dimension=dimension)
+        self.sample_latency = sample_latency
+        self.model = f"stub-{dimension}"
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.sample_latency())
+        return super().embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.sample_latency())
+        return super().embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Batched query embeddings (/analyze/batch) cost one call; ingestion has no latency
+        return self.embed_documents(texts)
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model stand-in: sleeps for a sampled latency and answers by naming the patterns in its prompt."""
+
+    sample_latency: Callable[[], float]
+    response_sentences: int = 8
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        names = [name.strip() for name in CONTEXT_NAME.findall(prompt)] or ["no specific pattern"]
+        sentences = ["I'm really sorry you're going through this, and thank you for sharing it."]
+        for i in range(self.response_sentences):
+            name = names[i % len(names)]
+            cue = "This is a serious red flag." if i % 3 == 0 else "This can be concerning over time."
+            sentences.append(f"What you describe resembles {name}. {cue}")
+        sentences.append("You are not alone, and support is available whenever you want it.")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(sentences)))])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.sample_latency())
+        return self._respond(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.sample_latency())
+        return self._respond(messages)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Throughput and latency percentiles (ms) for one endpoint."""
+    requests = len(latencies) + errors
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "req_per_sec": round(requests / elapsed, 2) if elapsed else 0.0,
+        **latency_summary(latencies),
+    }
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    requests: int,
+    concurrency: int,
+    warmup: int
+) -> Dict[str, Any]:
+    """Send `requests` requests to one endpoint from `concurrency` concurrent clients."""
+    async def send(i: int) -> httpx.Response:
+        if endpoint == "analyze":
+            story = TEST_CASES[i % len(TEST_CASES)]["query"]
+            return await client.post("/analyze", json={"content": story})
+        return await client.get(f"/{endpoint}")
+
+    for i in range(warmup):
+        await send(i)
+
+    latencies: List[float] = []
+    errors = 0
+    next_request = 0
+
+    async def worker():
+        nonlocal errors, next_request
+        while next_request < requests:
+            i = next_request
+            next_request += 1
+            started = time.perf_counter()
+            try:
+                response = await send(i)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def prepare(args: argparse.Namespace) -> Tuple[str, Settings, VectorStore, RAGChain]:
+    """Ingest into a temporary directory and build the stores the app is served with."""
+    rng = random.Random(args.seed)
+    persist_directory = tempfile.mkdtemp(prefix="fia-benchmark-")
+    settings = get_settings().model_copy(update={
+        "chroma_persist_directory": persist_directory,
+        "vector_backend": args.backend,
+        "embedding_provider": "hashing",
+        "embedding_cache_size": 1024 if args.cache else 0,
+        "embedding_cache_persist": False,
+        "response_cache_enabled": args.cache,
+    })
+
+    embeddings = StubEmbeddings(parse_latency(args.embedding_latency, rng))
+    llm = StubChatModel(sample_latency=parse_latency(args.llm_latency, rng))
+
+    # Ingest through Chroma; the served store may use another backend
+    print(f"Ingesting {args.data_dir} into {persist_directory}...", file=sys.stderr)
+    with contextlib.redirect_stdout(sys.stderr):
+        ingest_all_data(
+            args.data_dir,
+            clear_existing=True,
+            store=VectorStore(settings.model_copy(update={"vector_backend": "chroma"}), embeddings=embeddings)
+        )
+
+    vector_store = VectorStore(settings, embeddings=embeddings)
+    return persist_directory, settings, vector_store, RAGChain(vector_store=vector_store, llm=llm, settings=settings)
+
+
+async def drive(args: argparse.Namespace, vector_store: VectorStore, rag_chain: RAGChain) -> Dict[str, Any]:
+    """Serve the app in-process with the given stores and drive each endpoint in turn."""
+    app.dependency_overrides[get_vector_store] = lambda: vector_store
+    app.dependency_overrides[get_rag_chain] = lambda: rag_chain
+
+    results: Dict[str, Any] = {}
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                    for endpoint in args.endpoints:
+                        print(f"→ /{endpoint}: {args.requests} requests, concurrency {args.concurrency}", file=sys.stderr)
+                        results[f"/{endpoint}"] = await run_endpoint(
+                            client, endpoint, args.requests, args.concurrency, args.warmup
+                        )
+    finally:
+        app.dependency_overrides.pop(get_vector_store, None)
+        app.dependency_overrides.pop(get_rag_chain, None)
+    return results
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    persist_directory, settings, vector_store, rag_chain = prepare(args)
+    try:
+        results = asyncio.run(drive(args, vector_store, rag_chain))
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": timestamp(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "llm_latency": args.llm_latency,
+            "embedding_latency": args.embedding_latency,
+            "backend": args.backend,
+            "retrieval_mode": settings.retrieval_mode,
+            "cache": args.cache,
+            "seed": args.seed,
+        },
+        "endpoints": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline load benchmark for the API with stand-in LLM and embeddings"
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        default="./data",
+        help="Directory containing JSON data files (default: ./data)"
+    )
+    parser.add_argument(
+        "--endpoints",
+        type=lambda value: value.split(","),
+        default=ENDPOINTS,
+        help=f"Comma-separated endpoints to drive (default: {','.join(ENDPOINTS)})"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=200,
+        help="Requests per endpoint (default: 200)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Requests in flight at once (default: 16)"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=5,
+        help="Unrecorded requests per endpoint before measuring (default: 5)"
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=str,
+        default="lognormal:800,0.4",
+        help="LLM latency distribution in ms (default: lognormal:800,0.4)"
+    )
+    parser.add_argument(
+        "--embedding-latency",
+        type=str,
+        default="lognormal:60,0.3",
+        help="Query embedding latency distribution in ms (default: lognormal:60,0.3)"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["chroma", "numpy", "mmap"],
+        default="chroma",
+        help="Vector backend to serve with (default: chroma)"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Enable the query embedding and response caches"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for the latency distributions (default: 0)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="Write the JSON report to this file instead of stdout"
+    )
+
+    args = parser.parse_args()
+    unknown = [endpoint for endpoint in args.endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(unknown)} (expected some of {', '.join(ENDPOINTS)})")
+    for spec in (args.llm_latency, args.embedding_latency):
+        try:
+            parse_latency(spec, random.Random())
+        except ValueError as e:
+            parser.error(str(e))
+
+    report = run_benchmark(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"✓ Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
@@ -5,26 +5,37 @@ This script:
 1. Reads data from JSON files (Notion exports)
 2. Processes and structures the data for player typologies, abuse flavors, trauma, vulnerabilities
 3. Creates embeddings and stores in ChromaDB
+4. Builds and persists the BM25 keyword index used for hybrid retrieval
+5. Exports the memory-mapped serving index used by VECTOR_BACKEND=mmap
+
+Every document gets a stable ID (category + name) and a content hash, so
+re-running the script only embeds new or changed entries and deletes entries
+that are no longer in the JSON files.
 
 Usage:
     python scripts/ingest_data.py --clear  # Ingest all data files, clear existing data first
-    python scripts/ingest_data.py          # Ingest all data files, append to existing
+    python scripts/ingest_data.py          # Incrementally sync with existing data
 """
 
 import sys
 import os
+import re
 import json
+import hashlib
 import argparse
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from langchain_core.documents import Document
-from app.vector_store import vector_store
+from app.vector_store import VectorStore
 from app.config import settings
 
+# Ingestion always writes through Chroma; it also exports the serving index read by VECTOR_BACKEND=mmap
+vector_store = VectorStore(settings.model_copy(update={"vector_backend": "chroma"}))
+
 
 def load_json_file(file_path: str) -> Dict[str, Any]:
     """Load JSON data from file."""
@@ -34,6 +45,24 @@ def load_json_file(file_path: str) -> Dict[str, Any]:
     return data
 
 
+def document_id(category: str, name: str) -> str:
+    """Stable document ID derived from the category and entry name."""
+    slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+    return f"{category}:{slug or 'unknown'}"
+
+
+def content_hash(content: str, metadata: Dict[str, Any]) -> str:
+    """Hash of everything that ends up in the index for a document."""
+    payload = json.dumps({"content": content, "metadata": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def make_document(content: str, metadata: Dict[str, Any], name: str) -> Document:
+    """Create a document with a stable ID and a content hash in its metadata."""
+    metadata = dict(metadata, content_hash=content_hash(content, metadata))
+    return Document(id=document_id(metadata["category"], name), page_content=content, metadata=metadata)
+
+
 def process_player_typologies(data: Dict[str, Any]) -> List[Document]:
     """
     Process player typologies data into LangChain documents.
@@ -135,7 +164,7 @@ def process_player_typologies(data: Dict[str, Any]) -> List[Document]:
             metadata["abuse_flavors"] = ", ".join(abuse_flavors[:5])
 
         # Create document
-        doc = Document(page_content=content, metadata=metadata)
+        doc = make_document(content, metadata, name)
         documents.append(doc)
         print(f"  ✓ Processed: {name}")
 
@@ -175,7 +204,7 @@ def process_abuse_flavors(data: Any) -> List[Document]:
             "source": "notion_export"
         }
 
-        doc = Document(page_content=content, metadata=metadata)
+        doc = make_document(content, metadata, name)
         documents.append(doc)
         print(f"  ✓ Processed: {name}")
 
@@ -215,7 +244,7 @@ def process_trauma_types(data: Any) -> List[Document]:
             "source": "notion_export"
         }
 
-        doc = Document(page_content=content, metadata=metadata)
+        doc = make_document(content, metadata, name)
         documents.append(doc)
         print(f"  ✓ Processed: {name}")
 
@@ -259,29 +288,36 @@ def process_vulnerability_types(data: Any) -> List[Document]:
             "source": "notion_export"
         }
 
-        doc = Document(page_content=content, metadata=metadata)
+        doc = make_document(content, metadata, name)
         documents.append(doc)
         print(f"  ✓ Processed: {name}")
 
     return documents
 
 
-def ingest_all_data(data_dir: str, clear_existing: bool = False):
-    """Main ingestion function for all data files."""
+def ingest_all_data(
+    data_dir: str,
+    clear_existing: bool = False,
+    batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    store: Optional[VectorStore] = None
+):
+    """Main ingestion function for all data files. Writes to `store` (default: the configured store)."""
+    store = store or vector_store
     print("=" * 80)
     print("FIA Data Ingestion Script - Manipulation Pattern Database")
     print("=" * 80)
 
     # Initialize vector store
     print("\n[1/4] Initializing vector store...")
-    vector_store.initialize()
+    store.initialize()
 
     # Clear existing data if requested
     if clear_existing:
         print("\n[2/4] Clearing existing data...")
-        vector_store.clear()  # clear() now reinitializes automatically
+        store.clear()  # clear() now reinitializes automatically
     else:
-        print("\n[2/4] Appending to existing data...")
+        print("\n[2/4] Syncing with existing data...")
 
     all_documents = []
 
@@ -325,15 +361,34 @@ def ingest_all_data(data_dir: str, clear_existing: bool = False):
         all_documents.extend(docs)
         print(f"  Added {len(docs)} vulnerability documents")
 
-    # Add all documents to vector store
-    print(f"\n[4/4] Adding {len(all_documents)} total documents to vector store...")
-    if all_documents:
-        vector_store.add_documents(all_documents)
-        print("✓ All documents added successfully!")
-    else:
+    if not all_documents:
         print("⚠ No documents to add!")
         return
 
+    # Guard against two entries with the same name in one category
+    seen_ids: Dict[str, int] = {}
+    for doc in all_documents:
+        count = seen_ids.get(doc.id, 0)
+        seen_ids[doc.id] = count + 1
+        if count:
+            print(f"  ⚠ Duplicate document ID '{doc.id}', storing as '{doc.id}-{count + 1}'")
+            doc.id = f"{doc.id}-{count + 1}"
+
+    # Sync the vector store: embed only new/changed documents, delete removed ones
+    print(f"\n[4/4] Syncing {len(all_documents)} total documents with vector store...")
+    stats = store.sync_documents(all_documents, batch_size=batch_size, max_concurrency=max_concurrency)
+    print(
+        f"✓ Sync complete: {stats['added']} added, {stats['updated']} updated, "
+        f"{stats['deleted']} deleted, {stats['unchanged']} unchanged"
+    )
+    throughput = stats["throughput"]
+    if throughput:
+        print(
+            f"  Embedded {throughput['documents']} documents ({throughput['tokens']} tokens) "
+            f"in {throughput['seconds']:.1f}s: {throughput['docs_per_sec']:.1f} docs/sec, "
+            f"{throughput['tokens_per_sec']:.0f} tokens/sec, {throughput['retries']} retries"
+        )
+
     print("\n" + "=" * 80)
     print("Ingestion Complete!")
     print("=" * 80)
@@ -341,7 +396,7 @@ def ingest_all_data(data_dir: str, clear_existing: bool = False):
     # Test search
     print("\n🔍 Testing search with query: 'My partner says that he is always there for me but then everytime I call him he says he is busy'")
     print("-" * 80)
-    results = vector_store.similarity_search("My partner always needs to be right", k=3)
+    results = store.similarity_search("My partner always needs to be right", k=3)
     for i, doc in enumerate(results, 1):
         print(f"\n[Result {i}]")
         print(f"Category: {doc.metadata.get('category', 'Unknown')}")
@@ -366,10 +421,28 @@ if __name__ == "__main__":
         help="Clear existing data before ingesting"
     )
 
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help=f"Documents per embedding request (default: {settings.ingest_batch_size})"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help=f"Embedding requests in flight at once (default: {settings.ingest_max_concurrency})"
+    )
+
     args = parser.parse_args()
 
     try:
-        ingest_all_data(args.data_dir, clear_existing=args.clear)
+        ingest_all_data(
+            args.data_dir,
+            clear_existing=args.clear,
+            batch_size=args.batch_size,
+            max_concurrency=args.concurrency
+        )
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
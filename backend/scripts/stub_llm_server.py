@@ -0,0 +1,178 @@
+"""
+Local OpenAI-compatible chat completions server that injects latency and errors.
+
+Point the API at it to exercise LLM deadlines, hedging, the fallback model
+and circuit breakers without calling OpenAI:
+
+    OPENAI_BASE_URL=http://localhost:8900/v1 OPENAI_API_KEY=stub \\
+        LLM_FALLBACK_MODEL=gpt-4o-mini uvicorn app.main:app
+
+It answers /v1/chat/completions (plain or streamed) like the benchmark's
+stand-in LLM, naming the patterns in the prompt context. Latencies use the
+benchmark's distribution specs (milliseconds), e.g. lognormal:800,0.6, and
+can be set per model. A request fails with a 500 with probability
+--error-rate, and always for models listed in --fail-models.
+
+Usage:
+    python scripts/stub_llm_server.py                                   # lognormal:800,0.6 on port 8900
+    python scripts/stub_llm_server.py --latency lognormal:800,1.2 --error-rate 0.05
+    python scripts/stub_llm_server.py --model-latency gpt-4o=fixed:30000 --model-latency gpt-4o-mini=fixed:300
+    python scripts/stub_llm_server.py --fail-models gpt-4o              # Primary down: trips its circuit
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage
+
+from scripts.benchmark import StubChatModel, parse_latency
+
+
+def create_app(
+    latency: Callable[[], float],
+    model_latency: Dict[str, Callable[[], float]],
+    error_rate: float,
+    fail_models: List[str],
+    chunk_delay: float,
+    rng: random.Random
+) -> FastAPI:
+    """Build the stub server app."""
+    app = FastAPI(title="Stub LLM server")
+    responder = StubChatModel(sample_latency=lambda: 0.0)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        await asyncio.sleep(model_latency.get(model, latency)())
+
+        if model in fail_models or rng.random() < error_rate:
+            raise HTTPException(status_code=500, detail=f"Injected failure for {model}")
+
+        messages = [HumanMessage(content=str(message.get("content", ""))) for message in body.get("messages", [])]
+        content = responder._respond(messages).generations[0].message.content
+        completion_id = f"chatcmpl-stub-{rng.getrandbits(32):08x}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }
+
+        async def chunks():
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else " " + word}
+                yield "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+                }) + "\n\n"
+                await asyncio.sleep(chunk_delay)
+            yield "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local OpenAI-compatible chat server with injected latency and errors"
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Host to bind (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8900,
+        help="Port to listen on (default: 8900)"
+    )
+    parser.add_argument(
+        "--latency",
+        type=str,
+        default="lognormal:800,0.6",
+        help="Latency before answering, in ms (default: lognormal:800,0.6)"
+    )
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=SPEC",
+        help="Latency for one model, e.g. gpt-4o=fixed:30000 (repeatable)"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with a 500 (default: 0)"
+    )
+    parser.add_argument(
+        "--fail-models",
+        type=lambda value: [model.strip() for model in value.split(",") if model.strip()],
+        default=[],
+        help="Comma-separated models that always fail"
+    )
+    parser.add_argument(
+        "--chunk-delay",
+        type=float,
+        default=20.0,
+        help="Delay between streamed chunks, in ms (default: 20)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for latencies and errors (default: 0)"
+    )
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    try:
+        latency = parse_latency(args.latency, rng)
+        model_latency = {}
+        for value in args.model_latency:
+            model, separator, spec = value.partition("=")
+            if not separator:
+                raise ValueError(f"Invalid --model-latency {value!r} (expected MODEL=SPEC)")
+            model_latency[model] = parse_latency(spec, rng)
+    except ValueError as e:
+        parser.error(str(e))
+
+    app = create_app(latency, model_latency, args.error_rate, args.fail_models, args.chunk_delay / 1000, rng)
+    print(f"Stub LLM server on http://{args.host}:{args.port}/v1", file=sys.stderr)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
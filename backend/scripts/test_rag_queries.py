@@ -3,16 +3,35 @@ Test script with multiple real-world queries to validate RAG system.
 
 This script tests the vector search and RAG analysis with various
 manipulation pattern scenarios.
+
+With --eval it runs non-interactively instead: every TEST_CASES query is
+embedded in one batched call and retrieved per RETRIEVAL_MODE, and
+recall@k, precision@k, hit rate@k and MRR@k against expected_patterns are
+reported over a sweep of k, with per-query search latency, as JSON.
+
+Usage:
+    python scripts/test_rag_queries.py                         # Interactive menu
+    python scripts/test_rag_queries.py --eval                  # Evaluation report to stdout
+    python scripts/test_rag_queries.py --eval --k 1,3,5,10 --mode vector --output eval.json
 """
 
 import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.vector_store import vector_store
+from langchain_core.documents import Document
+from app.config import get_settings
+from app.vector_store import VectorStore, document_name, vector_store
 from app.rag_chain import rag_chain
+from scripts.reporting import git_commit, latency_summary, timestamp
 
 
 # Test cases covering different manipulation patterns
@@ -114,9 +133,9 @@ def test_vector_search_only():
         for j, (doc, score) in enumerate(results, 1):
             player_type = doc.metadata.get('player_type', 'N/A')
             category = doc.metadata.get('category', 'Unknown')
-            similarity = 1 - score  # Convert distance to similarity
 
-            print(f"  {j}. {player_type} (category: {category}, similarity: {similarity:.3f})")
+            # Squared L2 distance (Chroma's default space): lower is closer
+            print(f"  {j}. {player_type} (category: {category}, distance: {score:.3f})")
 
         # Check if expected patterns were found
         found_patterns = [doc.metadata.get('player_type', '') for doc, _ in results]
@@ -172,6 +191,120 @@ def test_full_rag_analysis(test_case_index: int = 0):
         traceback.print_exc()
 
 
+def matches_expected(name: str, expected: str) -> bool:
+    """Whether a retrieved document name satisfies an expected pattern (exact, or one of a combined name's parts)."""
+    return expected.lower() in name.lower()
+
+
+def evaluate_rankings(rankings: List[List[Document]], k_values: List[int]) -> Dict[str, Any]:
+    """recall@k, precision@k, hit rate@k and MRR@k of each ranking against its TEST_CASES expected_patterns."""
+    metrics = {k: {"recall": 0.0, "precision": 0.0, "hit_rate": 0.0, "mrr": 0.0} for k in k_values}
+    per_query = []
+
+    for test, ranking in zip(TEST_CASES, rankings):
+        names = [document_name(doc.metadata) for doc in ranking]
+        expected = test["expected_patterns"]
+        relevant = [any(matches_expected(name, pattern) for pattern in expected) for name in names]
+        first_relevant = next((rank for rank, hit in enumerate(relevant, 1) if hit), None)
+
+        for k in k_values:
+            top = names[:k]
+            found = sum(1 for pattern in expected if any(matches_expected(name, pattern) for name in top))
+            metrics[k]["recall"] += found / len(expected)
+            metrics[k]["precision"] += sum(relevant[:k]) / k
+            metrics[k]["hit_rate"] += 1.0 if any(relevant[:k]) else 0.0
+            metrics[k]["mrr"] += 1.0 / first_relevant if first_relevant and first_relevant <= k else 0.0
+
+        per_query.append({
+            "name": test["name"],
+            "expected": expected,
+            "retrieved": names,
+            "first_relevant_rank": first_relevant,
+        })
+
+    return {
+        "metrics": {
+            str(k): {metric: round(total / len(TEST_CASES), 4) for metric, total in values.items()}
+            for k, values in metrics.items()
+        },
+        "queries": per_query,
+    }
+
+
+async def run_evaluation(store: VectorStore, k_values: List[int]) -> Dict[str, Any]:
+    """Embed every query in one batch, then time each query's retrieval separately."""
+    queries = [test["query"] for test in TEST_CASES]
+    max_k = max(k_values)
+
+    embeddings: List[Optional[List[float]]] = [None] * len(queries)
+    embedding_seconds = 0.0
+    if store.retrieval_mode != "lexical":
+        started = time.perf_counter()
+        embeddings = await store.embeddings.aembed_queries(queries)
+        embedding_seconds = time.perf_counter() - started
+
+    rankings, latencies = [], []
+    for query, embedding in zip(queries, embeddings):
+        started = time.perf_counter()
+        rankings.append(await store.aretrieve_by_vector(query, embedding, k=max_k))
+        latencies.append(time.perf_counter() - started)
+
+    report = evaluate_rankings(rankings, k_values)
+    for entry, seconds in zip(report["queries"], latencies):
+        entry["search_ms"] = round(seconds * 1000, 3)
+
+    provider, dimension = store.embedding_signature
+    _, documents = store.collection_documents()
+    return {
+        "commit": git_commit(),
+        "timestamp": timestamp(),
+        "config": {
+            "backend": store.backend,
+            "retrieval_mode": store.retrieval_mode,
+            "embeddings": provider,
+            "embedding_dimension": dimension,
+            "documents": len(documents),
+            "queries": len(queries),
+            "k": k_values,
+        },
+        "embedding": {
+            "batch_seconds": round(embedding_seconds, 4),
+            "queries": len(queries) if store.retrieval_mode != "lexical" else 0,
+        },
+        "metrics": report["metrics"],
+        "search_latency": latency_summary(latencies),
+        "queries": report["queries"],
+    }
+
+
+def evaluate(args: argparse.Namespace):
+    """Non-interactive retrieval evaluation (--eval)."""
+    overrides = {
+        name: value for name, value in
+        (("vector_backend", args.backend), ("retrieval_mode", args.mode))
+        if value is not None
+    }
+    store = VectorStore(get_settings().model_copy(update=overrides)) if overrides else vector_store
+    with contextlib.redirect_stdout(sys.stderr):
+        store.initialize()
+
+    report = asyncio.run(run_evaluation(store, args.k))
+    for k, values in report["metrics"].items():
+        print(
+            f"k={k}: recall {values['recall']:.3f}, precision {values['precision']:.3f}, "
+            f"hit rate {values['hit_rate']:.3f}, MRR {values['mrr']:.3f}",
+            file=sys.stderr
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"✓ Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
 def interactive_menu():
     """Interactive menu for testing."""
     print("\n" + "=" * 100)
@@ -216,7 +349,7 @@ def interactive_menu():
                 print(f"\nTop 5 matches:")
                 for i, (doc, score) in enumerate(results, 1):
                     player_type = doc.metadata.get('player_type', 'Unknown')
-                    print(f"  {i}. {player_type} (similarity: {1-score:.3f})")
+                    print(f"  {i}. {player_type} (distance: {score:.3f})")
 
         elif choice == "5":
             query = input("\nEnter your query: ").strip()
@@ -238,6 +371,39 @@ def interactive_menu():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test retrieval and RAG analysis on real-world queries")
+    parser.add_argument(
+        "--eval",
+        action="store_true",
+        help="Run the non-interactive retrieval evaluation and print a JSON report"
+    )
+    parser.add_argument(
+        "--k",
+        type=lambda value: sorted({int(k) for k in value.split(",")}),
+        default=[1, 3, 5, 10],
+        help="Comma-separated cutoffs to evaluate (default: 1,3,5,10)"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["vector", "lexical", "hybrid"],
+        help="Retrieval mode to evaluate (default: RETRIEVAL_MODE)"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["chroma", "numpy", "mmap"],
+        help="Vector backend to evaluate (default: VECTOR_BACKEND)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="With --eval, write the JSON report to this file instead of stdout"
+    )
+    args = parser.parse_args()
+
+    if args.eval:
+        evaluate(args)
+        sys.exit(0)
+
     print("Initializing RAG system...")
 
     try:
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Any, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+DOCUMENTS = [
+    Document(
+        id="critic",
+        page_content="Name: The Critic\nDescription: Finds fault with everything you do.",
+        metadata={"category": "player_typology", "player_type": "The Critic"}
+    ),
+    Document(
+        id="silent",
+        page_content="Name: The Water Torturer\nDescription: Uses the silent treatment to punish.",
+        metadata={"category": "player_typology", "player_type": "The Water Torturer"}
+    ),
+]
+
+
+class FakeVectorStore:
+    """Stands in for VectorStore in RAGChain: every query retrieves DOCUMENTS."""
+
+    backend = "numpy"
+    index_version = "v1"
+
+    def initialize(self):
+        return self
+
+    async def aretrieve(self, query: str, k: int = 4):
+        return [1.0, 0.0], DOCUMENTS[:k]
+
+    async def abatch_similarity_search(self, queries: List[str], k: int = 4):
+        return [[1.0, 0.0] for _ in queries], [DOCUMENTS[:k] for _ in queries]
+
+    def collection_documents(self):
+        return self.index_version, DOCUMENTS
+
+    def collection_metadatas(self):
+        return self.index_version, [doc.metadata for doc in DOCUMENTS]
+
+    def documents_by_id(self, ids: List[str]) -> List[Document]:
+        by_id = {doc.id: doc for doc in DOCUMENTS}
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+
+class SlowChatModel(BaseChatModel):
+    """Answers after `latency` seconds, counting its calls and keeping their prompts."""
+
+    latency: float = 0.1
+    calls: int = 0
+    prompts: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        self.prompts.append("\n".join(str(message.content) for message in messages))
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="This resembles The Critic."))])
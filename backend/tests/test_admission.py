@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+
+from app.admission import AdmissionController, get_admission_controller
+from app.config import get_settings
+from app.main import app
+from app.rag_chain import RAGChain, get_rag_chain
+from fakes import FakeVectorStore, SlowChatModel
+
+
+def test_identical_concurrent_analyses_are_not_shed():
+    llm = SlowChatModel(latency=0.2)
+    settings = get_settings().model_copy(update={"response_cache_enabled": True})
+    chain = RAGChain(vector_store=FakeVectorStore(), llm=llm, settings=settings)
+    admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+    app.dependency_overrides[get_rag_chain] = lambda: chain
+    app.dependency_overrides[get_admission_controller] = lambda: admission
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            first = await asyncio.gather(*(
+                client.post("/analyze", json={"content": "He criticizes everything I do."}) for _ in range(8)
+            ))
+            # Served from the response cache without taking a slot, even when none is free
+            await admission.acquire()
+            try:
+                cached = await client.post("/analyze", json={"content": "He criticizes everything I do."})
+            finally:
+                admission.release()
+            return first, cached
+
+    try:
+        first, cached = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [response.status_code for response in first] == [200] * 8
+    assert (cached.status_code, cached.headers["X-Cache"]) == (200, "HIT")
+    assert llm.calls == 1
+    assert admission.rejected == {"queue_full": 0, "queue_timeout": 0, "draining": 0}
+
+
+def test_distinct_analyses_beyond_the_queue_are_shed():
+    llm = SlowChatModel(latency=0.2)
+    chain = RAGChain(vector_store=FakeVectorStore(), llm=llm, settings=get_settings())
+    admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+    app.dependency_overrides[get_rag_chain] = lambda: chain
+    app.dependency_overrides[get_admission_controller] = lambda: admission
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/analyze", json={"content": f"Story number {i}."}) for i in range(4)
+            ))
+
+    try:
+        responses = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert sorted(response.status_code for response in responses) == [200, 200, 429, 429]
+    assert llm.calls == 2
+
+
+def test_batch_generations_take_admission_slots():
+    llm = SlowChatModel(latency=0.2)
+    chain = RAGChain(vector_store=FakeVectorStore(), llm=llm, settings=get_settings())
+    admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+    app.dependency_overrides[get_rag_chain] = lambda: chain
+    app.dependency_overrides[get_admission_controller] = lambda: admission
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/analyze/batch", json={
+                "messages": [{"content": f"Story number {i}."} for i in range(4)],
+                "max_concurrency": 4
+            })
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+
+    body = response.json()
+    assert (response.status_code, body["succeeded"], body["failed"]) == (200, 2, 2)
+    assert admission.rejected["queue_full"] == 2
+    assert llm.calls == 2
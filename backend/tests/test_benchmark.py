@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import os
+import random
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.admission import AdmissionController, get_admission_controller
+from app.main import app
+from scripts.benchmark import ENDPOINTS, StubChatModel, parse_latency, run_benchmark
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def test_latency_specs_sample_seconds():
+    rng = random.Random(0)
+
+    assert parse_latency("fixed:50", rng)() == 0.05
+    assert all(0.5 <= parse_latency("uniform:500,1500", rng)() <= 1.5 for _ in range(100))
+    assert all(parse_latency("normal:10,100", rng)() >= 0 for _ in range(100))
+    assert all(parse_latency("lognormal:800,0.5", rng)() > 0 for _ in range(100))
+
+
+@pytest.mark.parametrize("spec", ["fixed", "fixed:a", "uniform:1", "gamma:1,2"])
+def test_invalid_latency_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_latency(spec, random.Random(0))
+
+
+def test_stub_llm_names_the_patterns_in_its_prompt():
+    llm = StubChatModel(sample_latency=lambda: 0.0)
+    prompt = "Player Type: The Critic\nDescription: ...\nAbuse Flavor: Silent Treatment\n"
+
+    response = asyncio.run(llm.ainvoke([HumanMessage(content=prompt)])).content
+
+    assert "resembles The Critic." in response
+    assert "resembles Silent Treatment." in response
+
+
+def test_benchmark_reports_every_endpoint():
+    args = argparse.Namespace(
+        data_dir=DATA_DIR, endpoints=ENDPOINTS, requests=6, concurrency=3, warmup=1,
+        llm_latency="fixed:1", embedding_latency="fixed:1", backend="numpy", cache=False, seed=0
+    )
+    # The benchmark drains the admission controller on shutdown, so keep it away from the shared one
+    app.dependency_overrides[get_admission_controller] = lambda: AdmissionController(
+        max_concurrency=8, max_queue=8, queue_timeout=5
+    )
+    try:
+        report = run_benchmark(args)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert report["config"]["backend"] == "numpy"
+    assert set(report["endpoints"]) == {"/analyze", "/patterns", "/health"}
+    for summary in report["endpoints"].values():
+        assert (summary["requests"], summary["errors"]) == (6, 0)
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"] <= summary["max_ms"]
+        assert summary["req_per_sec"] > 0
@@ -0,0 +1,13 @@
+from app.chunking import split_story
+from app.tokens import count_tokens
+
+
+def test_unpunctuated_story_is_split_within_the_chunk_size():
+    words = [f"he said word{i % 50} again and again" for i in range(500)]
+    text = " ".join(words)
+
+    chunks = split_story(text, chunk_tokens=120, max_chunks=1000)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 120 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
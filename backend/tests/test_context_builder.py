@@ -0,0 +1,69 @@
+from langchain_core.documents import Document
+
+from app.context_builder import ContextBuilder
+from app.tokens import count_tokens
+
+
+CRITIC = Document(
+    id="critic",
+    page_content=(
+        "Name: The Critic\n"
+        "Description: Finds fault with everything you do.\n"
+        "Red Flags: Constant criticism, Mocking your choices, Never satisfied, "
+        "Comparing you to others, Nitpicking in public, Dismissing your achievements, "
+        "Correcting how you speak, Criticism disguised as jokes"
+    ),
+    metadata={"content_hash": "1"}
+)
+JUDGE = Document(
+    id="judge",
+    page_content=(
+        "Name: The Judge\n"
+        "Description: Rules on everything you say.\n"
+        "Red Flags: constant criticism, Moral superiority"
+    ),
+    metadata={"content_hash": "1"}
+)
+
+
+def test_duplicate_items_are_dropped_across_blocks():
+    context, tokens = ContextBuilder([CRITIC, JUDGE]).build([CRITIC, JUDGE], token_budget=1000)
+
+    assert context.count("onstant criticism") == 1
+    assert "Red Flags: Moral superiority" in context
+    assert count_tokens(context) <= tokens
+
+
+def test_context_stays_within_the_budget():
+    builder = ContextBuilder([CRITIC, JUDGE])
+    full = builder.block(CRITIC).tokens
+
+    for budget in range(0, 2 * full + 10, 3):
+        context, tokens = builder.build([CRITIC, JUDGE], token_budget=budget)
+        assert tokens <= budget
+        assert count_tokens(context) <= max(tokens, 0) + 1
+
+
+def test_blocks_that_do_not_fit_are_reduced_to_their_header():
+    builder = ContextBuilder([CRITIC, JUDGE])
+    critic = builder.block(CRITIC)
+    budget = critic.tokens + 1 + builder.block(JUDGE).core_tokens + 1
+
+    context, _ = builder.build([CRITIC, JUDGE], token_budget=budget)
+
+    assert "Red Flags: Constant criticism" in context
+    assert "Name: The Judge\nDescription: Rules on everything you say." in context
+    assert "Moral superiority" not in context
+
+
+def test_reduced_block_does_not_hide_its_items_from_later_blocks():
+    builder = ContextBuilder([CRITIC, JUDGE])
+    critic, judge = builder.block(CRITIC), builder.block(JUDGE)
+    budget = critic.core_tokens + 1 + judge.tokens + 1
+    assert critic.tokens + 1 > budget
+
+    context, _ = builder.build([CRITIC, JUDGE], token_budget=budget)
+
+    # The Critic's red flags were left out, so The Judge keeps its copy of one
+    assert "Mocking your choices" not in context
+    assert "Red Flags: constant criticism, Moral superiority" in context
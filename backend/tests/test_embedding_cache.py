@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.embedding_cache import CachedEmbeddings
+
+
+def make_cache(tmp_path, **kwargs) -> CachedEmbeddings:
+    cache = CachedEmbeddings(DeterministicFakeEmbedding(size=8), persist_path=str(tmp_path / "cache.sqlite3"), **kwargs)
+    # Prune only when a test asks for it
+    cache.PRUNE_INTERVAL = float("inf")
+    return cache
+
+
+def disk_keys(cache: CachedEmbeddings):
+    with sqlite3.connect(cache.persist_path) as db:
+        return {key for key, in db.execute("SELECT key FROM query_embeddings")}
+
+
+def test_prune_drops_expired_rows(tmp_path):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache._write_disk([("old", [1.0])], time.time() - 120)
+    cache._write_disk([("new", [2.0])], time.time())
+
+    assert cache.prune() == 1
+    assert disk_keys(cache) == {"new"}
+
+
+def test_prune_keeps_newest_rows_up_to_max(tmp_path):
+    cache = make_cache(tmp_path, max_disk_rows=3)
+    now = time.time()
+    for i in range(5):
+        cache._write_disk([(f"key-{i}", [float(i)])], now - 10 + i)
+
+    assert cache.prune() == 2
+    assert disk_keys(cache) == {"key-2", "key-3", "key-4"}
+
+
+def test_writes_prune_periodically(tmp_path):
+    cache = make_cache(tmp_path, max_disk_rows=2)
+    cache.PRUNE_INTERVAL = 0.0
+    asyncio.run(cache.aembed_queries([f"query {i}" for i in range(5)]))
+    assert len(disk_keys(cache)) == 2
+
+
+def test_async_disk_io_runs_off_the_event_loop(tmp_path):
+    cache = make_cache(tmp_path)
+    vector = cache.embed_query("a story")
+    cache._memory.clear()
+
+    threads = []
+    for name in ("_lookup_disk", "_write_disk"):
+        method = getattr(cache, name)
+
+        def record(*args, method=method):
+            threads.append(threading.current_thread())
+            return method(*args)
+
+        setattr(cache, name, record)
+
+    async def run():
+        assert await cache.aembed_query("a story") == vector
+        await cache.aembed_query("another story")
+
+    asyncio.run(run())
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+    assert cache.disk_hits == 1
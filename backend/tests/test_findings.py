@@ -0,0 +1,71 @@
+from app.findings import FindingsExtractor
+
+
+METADATAS = [
+    {"category": "player_typology", "player_type": "The Critic", "alias": "Fault Finder"},
+    {"category": "player_typology", "player_type": "Dr. Jekyll/Mr. Hyde"},
+    {"category": "abuse_flavor", "abuse_flavor": "Silent Treatment"},
+    {"category": "trauma", "trauma_type": "Hypervigilance"},
+]
+
+RESPONSE = (
+    "Your partner behaves like The Critic. "
+    "The silent treatment you describe is abusive and serious.\n"
+    "Feeling on edge all the time can be hypervigilance. "
+    "Some call this a Fault Finder, which is concerning."
+)
+
+
+def _summary(findings):
+    return [(finding.matched_pattern, finding.type, finding.title) for finding in findings]
+
+
+def test_findings_cover_the_whole_vocabulary_with_per_sentence_severity():
+    findings = FindingsExtractor(METADATAS).extract(RESPONSE)
+
+    assert _summary(findings) == [
+        ("The Critic", "warning", "Pattern Detected: The Critic"),
+        ("Silent Treatment", "danger", "Abuse Flavor: Silent Treatment"),
+        ("Hypervigilance", "info", "Trauma Sign: Hypervigilance"),
+    ]
+
+
+def test_parts_of_combined_names_and_word_boundaries():
+    extractor = FindingsExtractor(METADATAS)
+
+    assert _summary(extractor.extract("He switches into Mr. Hyde without warning.")) == [
+        ("Dr. Jekyll/Mr. Hyde", "warning", "Pattern Detected: Dr. Jekyll/Mr. Hyde"),
+    ]
+    # "The Critic" inside a longer word is not a mention
+    assert extractor.extract("The Criticism was fair.") == []
+
+
+def test_streamed_chunks_find_what_a_single_pass_finds():
+    extractor = FindingsExtractor(METADATAS)
+    expected = _summary(extractor.extract(RESPONSE))
+
+    for size in (1, 2, 3, 5, 7, 11, 64):
+        scanner = extractor.scanner()
+        streamed = []
+        for start in range(0, len(RESPONSE), size):
+            streamed.extend(scanner.feed(RESPONSE[start:start + size]))
+        final = scanner.finish()
+
+        assert _summary(final) == expected, size
+        # Findings are reported as soon as their sentence is complete, each once
+        assert [finding.matched_pattern for finding in streamed] == ["The Critic", "Silent Treatment", "Hypervigilance"], size
+
+
+def test_match_ending_a_chunk_is_confirmed_by_the_next_chunk():
+    extractor = FindingsExtractor(METADATAS)
+
+    scanner = extractor.scanner()
+    assert scanner.feed("This is The Crit") == []
+    assert scanner.feed("ic") == []
+    # The next character decides whether "The Critic" was a whole word
+    scanner.feed("ism. ")
+    assert scanner.finish() == []
+
+    scanner = extractor.scanner()
+    scanner.feed("This is The Critic")
+    assert [finding.matched_pattern for finding in scanner.feed(". Next")] == ["The Critic"]
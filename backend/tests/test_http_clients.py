@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.config import get_settings
+from app.http_clients import HTTPClients, _AsyncCountingTransport, _PoolUsage, get_http_clients
+from app.rag_chain import RAGChain
+from app.vector_store import VectorStore
+
+
+async def body():
+    yield b"ok"
+
+
+def test_counting_transport_counts_until_the_response_is_closed():
+    usage = _PoolUsage(max_connections=1)
+    transport = _AsyncCountingTransport(httpx.MockTransport(lambda request: httpx.Response(200, content=body())), usage)
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("GET", "http://test/") as response:
+                assert usage.in_flight == 1
+                assert await response.aread() == b"ok"
+            assert usage.in_flight == 0
+
+            await client.get("http://test/")
+            assert usage.stats == {"in_flight": 0, "waiting": 0, "max_connections": 1}
+
+    asyncio.run(run())
+
+
+def test_closing_clients_bumps_the_generation():
+    clients = HTTPClients()
+    asyncio.run(clients.aclose())
+    assert clients.generation == 0
+
+    clients.open()
+    asyncio.run(clients.aclose())
+    assert clients.generation == 1
+    assert not clients.async_client.is_closed
+
+
+def test_models_are_rebuilt_after_the_clients_close():
+    settings = get_settings().model_copy(update={"openai_api_key": "test", "embedding_provider": "openai"})
+    store = VectorStore(settings)
+    chain = RAGChain(vector_store=store, settings=settings)
+    injected = RAGChain(vector_store=store, settings=settings, llm=FakeListChatModel(responses=["ok"]))
+
+    llm, provider, injected_llm = chain.llm, store.embeddings.embeddings, injected.llm
+    asyncio.run(get_http_clients().aclose())
+
+    assert chain.llm is not llm
+    assert chain.llm.http_async_client is get_http_clients().async_client
+    assert store.embeddings.embeddings is not provider
+    assert store.embeddings.embeddings.http_async_client is get_http_clients().async_client
+    assert injected.llm is injected_llm
@@ -0,0 +1,27 @@
+from langchain_core.documents import Document
+
+from app.lexical_index import BM25Index, MappedPostings
+
+
+DOCUMENTS = [
+    Document(id="a", page_content="He gives me the silent treatment for days."),
+    Document(id="b", page_content="He controls all our money and checks every receipt."),
+    Document(id="c", page_content="The silent treatment is a way to punish without words."),
+]
+
+
+def test_mapped_arrays_score_like_the_in_memory_index(tmp_path):
+    index = BM25Index(DOCUMENTS, version="v1")
+    index.save_arrays(str(tmp_path))
+
+    mapped = BM25Index.load_arrays(str(tmp_path), DOCUMENTS, version="v1")
+    assert isinstance(mapped.postings, MappedPostings)
+    for query in ("silent treatment", "money", "nothing matches"):
+        assert mapped.search_with_score(query, k=3) == index.search_with_score(query, k=3)
+
+
+def test_load_arrays_handles_missing_and_empty_exports(tmp_path):
+    assert BM25Index.load_arrays(str(tmp_path), DOCUMENTS) is None
+
+    BM25Index([]).save_arrays(str(tmp_path))
+    assert BM25Index.load_arrays(str(tmp_path), []).search_with_score("anything") == []
@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+
+from app.admission import AdmissionController, get_admission_controller
+from app.config import get_settings
+from app.main import app
+from app.profiling import ProfilingMiddleware
+from app.rag_chain import RAGChain, get_rag_chain
+from fakes import FakeVectorStore, SlowChatModel
+
+
+def test_profiles_of_a_coalesced_analysis_follow_the_shared_computation(tmp_path):
+    llm = SlowChatModel(latency=0.3)
+    chain = RAGChain(vector_store=FakeVectorStore(), llm=llm, settings=get_settings())
+    app.dependency_overrides[get_rag_chain] = lambda: chain
+    app.dependency_overrides[get_admission_controller] = lambda: AdmissionController(max_concurrency=4, max_queue=4, queue_timeout=1)
+    settings = get_settings().model_copy(update={"profile_header_enabled": True, "profile_directory": str(tmp_path)})
+    profiled = ProfilingMiddleware(app, settings=settings)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=profiled), base_url="http://test") as client:
+            async def analyze(request_id: str):
+                headers = {"X-Profile": "1", "X-Request-ID": request_id}
+                return await client.post("/analyze", json={"content": "He criticizes everything I do."}, headers=headers)
+
+            leader = asyncio.ensure_future(analyze("leader"))
+            await asyncio.sleep(0.05)
+            return await asyncio.gather(leader, analyze("follower"))
+
+    try:
+        responses = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert llm.calls == 1
+    for request_id in ("leader", "follower"):
+        stacks = [line.rsplit(" ", 1)[0].split(";") for line in (tmp_path / f"{request_id}.folded").read_text().splitlines()]
+        names = [[frame.split(" (")[0] for frame in stack] for stack in stacks]
+        assert any(
+            "SingleFlight.do" in stack and stack.index("RAGChain._agenerate") > stack.index("SingleFlight.do")
+            for stack in names if "RAGChain._agenerate" in stack
+        ), request_id
@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.embeddings import HashingEmbeddings
+from app.vector_store import VectorStore
+from scripts.ingest_data import ingest_all_data
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+STORY = "He gives me the silent treatment for days whenever I disagree with him."
+
+
+class SlowEmbeddings(HashingEmbeddings):
+    """Hashing embeddings whose query embeddings take `latency` seconds, or fail."""
+
+    def __init__(self, latency: float = 0.0, error: bool = False):
+        super().__init__()
+        self.latency = latency
+        self.error = error
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        if self.error:
+            raise RuntimeError("embeddings API unavailable")
+        return self.embed_query(text)
+
+
+@pytest.fixture(scope="module")
+def settings(tmp_path_factory):
+    settings = get_settings().model_copy(update={
+        "chroma_persist_directory": str(tmp_path_factory.mktemp("chroma")),
+        "embedding_provider": "hashing",
+        "embedding_cache_size": 0,
+        "embedding_cache_persist": False,
+        "retrieval_mode": "hybrid",
+        "embedding_timeout_seconds": 0.1,
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest_all_data(
+            DATA_DIR,
+            clear_existing=True,
+            store=VectorStore(settings.model_copy(update={"vector_backend": "chroma"}), embeddings=HashingEmbeddings())
+        )
+    return settings
+
+
+def _store(settings, embeddings, **overrides) -> VectorStore:
+    return VectorStore(settings.model_copy(update={"vector_backend": "numpy", **overrides}), embeddings=embeddings).initialize()
+
+
+def test_hybrid_retrieval_fuses_vector_and_lexical_rankings(settings):
+    store = _store(settings, SlowEmbeddings())
+
+    embedding, docs = asyncio.run(store.aretrieve(STORY, k=5))
+
+    assert embedding is not None
+    assert len(docs) == 5
+    lexical_ids = [doc.id for doc in store.lexical_search(STORY, k=settings.retrieval_fetch_k)]
+    assert docs[0].id in lexical_ids
+
+
+@pytest.mark.parametrize("embeddings", [SlowEmbeddings(latency=5), SlowEmbeddings(error=True)], ids=["timeout", "error"])
+def test_hybrid_retrieval_falls_back_to_lexical_when_embedding_fails(settings, embeddings):
+    store = _store(settings, embeddings)
+
+    started = time.perf_counter()
+    embedding, docs = asyncio.run(store.aretrieve(STORY, k=5))
+
+    assert time.perf_counter() - started < 2
+    assert embedding is None
+    assert [doc.id for doc in docs] == [doc.id for doc in store.lexical_search(STORY, k=5)]
+
+
+def test_vector_retrieval_does_not_fall_back(settings):
+    store = _store(settings, SlowEmbeddings(latency=5), retrieval_mode="vector")
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(store.aretrieve(STORY, k=5))
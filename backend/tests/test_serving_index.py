@@ -0,0 +1,27 @@
+import builtins
+
+from app.serving_index import VersionFile, atomic_write
+
+
+def test_version_file_is_reread_only_when_replaced(tmp_path, monkeypatch):
+    path = str(tmp_path / "index_version")
+    version = VersionFile(path)
+    assert version.read() is None
+
+    opened = []
+    real_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        if file == path:
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", counting_open)
+
+    atomic_write(path, "v1")
+    assert [version.read() for _ in range(5)] == ["v1"] * 5
+    assert len(opened) == 1
+
+    atomic_write(path, "v2")
+    assert version.read() == "v2"
+    assert len(opened) == 2
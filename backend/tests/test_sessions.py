@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+import httpx
+
+from app.admission import AdmissionController, get_admission_controller
+from app.config import get_settings
+from app.main import app
+from app.rag_chain import RAGChain, get_rag_chain
+from app.sessions import Session, SessionStore, get_session_store
+from app.vector_store import get_vector_store
+from fakes import FakeVectorStore, SlowChatModel
+
+
+def test_startup_does_not_open_the_session_database(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    sessions = SessionStore(path=path)
+    vector_store = FakeVectorStore()
+    chain = RAGChain(vector_store=vector_store, llm=SlowChatModel(), settings=get_settings())
+    app.dependency_overrides[get_session_store] = lambda: sessions
+    app.dependency_overrides[get_vector_store] = lambda: vector_store
+    app.dependency_overrides[get_rag_chain] = lambda: chain
+    # Shutdown drains the admission controller, so keep it away from the shared one
+    admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1)
+    app.dependency_overrides[get_admission_controller] = lambda: admission
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            pass
+
+    try:
+        asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert not os.path.exists(path)
+    sessions.save(Session("abc"))
+    assert os.path.exists(path)
+
+
+def test_idle_sessions_are_evicted_from_disk(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    writer = SessionStore(path=path, idle_ttl_seconds=60)
+    writer.SWEEP_INTERVAL = float("inf")
+    now = time.time()
+    asyncio.run(writer.asave(Session("idle", turns=["first"], updated_at=now - 120)))
+    asyncio.run(writer.asave(Session("active", turns=["second"], updated_at=now)))
+
+    # A fresh store (e.g. another worker) has neither session in memory
+    reader = SessionStore(path=path, idle_ttl_seconds=60)
+    assert reader.evict_idle() == 1
+    with sqlite3.connect(path) as db:
+        assert [row[0] for row in db.execute("SELECT id FROM analysis_sessions")] == ["active"]
+    assert asyncio.run(reader.aget("idle")) is None
+    assert asyncio.run(reader.aget("active")).turns == ["second"]
+
+
+def test_sessions_are_started_under_server_issued_ids():
+    sessions = SessionStore()
+    llm = SlowChatModel(latency=0)
+    chain = RAGChain(vector_store=FakeVectorStore(), llm=llm, settings=get_settings())
+    app.dependency_overrides[get_session_store] = lambda: sessions
+    app.dependency_overrides[get_rag_chain] = lambda: chain
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            started = await client.post("/analyze", json={"content": "He criticizes me.", "start_session": True})
+            session_id = started.json()["session_id"]
+            follow_up = await client.post("/analyze", json={"content": "Then he stops talking.", "session_id": session_id})
+            chosen = await client.post("/analyze", json={"content": "Hello.", "session_id": "my-own-id"})
+            both = await client.post("/analyze", json={"content": "Hello.", "start_session": True, "session_id": session_id})
+            deleted = await client.delete(f"/sessions/{session_id}")
+            after_delete = await client.post("/analyze", json={"content": "Again.", "session_id": session_id})
+            deleted_again = await client.delete(f"/sessions/{session_id}")
+            return started, follow_up, chosen, both, deleted, after_delete, deleted_again
+
+    try:
+        started, follow_up, chosen, both, deleted, after_delete, deleted_again = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+
+    session_id = started.json()["session_id"]
+    assert started.status_code == 200 and len(session_id) >= 32
+    assert (follow_up.status_code, follow_up.json()["session_id"]) == (200, session_id)
+    assert chosen.status_code == 404
+    assert sessions.get("my-own-id") is None
+    assert both.status_code == 422
+    assert deleted.status_code == 204
+    assert after_delete.status_code == 404
+    assert deleted_again.status_code == 404
+    assert llm.calls == 2
+
+
+def test_sessions_beyond_the_limit_are_evicted_from_disk(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    sessions = SessionStore(path=path, max_sessions=3)
+    sessions.SWEEP_INTERVAL = float("inf")
+    now = time.time()
+    for i in range(5):
+        sessions.save(Session(f"s{i}", turns=[f"turn {i}"], updated_at=now - 10 + i))
+
+    assert sessions.evict_idle() == 2
+    with sqlite3.connect(path) as db:
+        assert sorted(row[0] for row in db.execute("SELECT id FROM analysis_sessions")) == ["s2", "s3", "s4"]
+    assert sessions.get("s0") is None
+
+
+def test_streaming_rejects_session_fields():
+    llm = SlowChatModel(latency=0)
+    chain = RAGChain(vector_store=FakeVectorStore(), llm=llm, settings=get_settings())
+    app.dependency_overrides[get_rag_chain] = lambda: chain
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            started = await client.post("/analyze/stream", json={"content": "He criticizes me.", "start_session": True})
+            continued = await client.post("/analyze/stream", json={"content": "He criticizes me.", "session_id": "abc"})
+            return started, continued
+
+    try:
+        responses = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [response.status_code for response in responses] == [422, 422]
+    assert llm.calls == 0
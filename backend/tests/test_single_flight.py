@@ -0,0 +1,67 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from app.embedding_cache import CachedEmbeddings
+from app.single_flight import SingleFlight
+
+
+class SlowEmbeddings(Embeddings):
+    """Records every text sent to the provider."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0.05)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        self.calls.append([text])
+        await asyncio.sleep(0.05)
+        return self.embed_query(text)
+
+
+def test_do_many_joins_calls_in_flight():
+    flight = SingleFlight("test")
+    computed = []
+
+    async def compute(keys):
+        computed.append(keys)
+        await asyncio.sleep(0.01)
+        return [key.upper() for key in keys]
+
+    async def run():
+        async def compute_one():
+            return (await compute(["a"]))[0]
+
+        single = asyncio.ensure_future(flight.do("a", compute_one))
+        await asyncio.sleep(0)
+        many = await flight.do_many(["a", "b", "c", "b"], compute)
+        return (await single)[0], many
+
+    assert asyncio.run(run()) == ("A", ["A", "B", "C", "B"])
+    assert computed == [["a"], ["b", "c"]]
+    assert len(flight) == 0
+
+
+def test_batch_embedding_joins_in_flight_single_queries():
+    provider = SlowEmbeddings()
+    cache = CachedEmbeddings(provider)
+
+    async def run():
+        single = asyncio.ensure_future(cache.aembed_query("he shouted"))
+        await asyncio.sleep(0)
+        batch = await cache.aembed_queries(["he  shouted ", "she left", "she left"])
+        return await single, batch
+
+    single, batch = asyncio.run(run())
+    assert batch == [single, [8.0], [8.0]]
+    assert provider.calls == [["he shouted"], ["she left"]]
@@ -0,0 +1,33 @@
+from app import tokens
+from app.tokens import count_tokens, count_tokens_batch, split_tokens
+
+
+TEXTS = ["He criticizes everything I do.", "Then he stops talking to me for days.", ""]
+
+
+def test_batch_count_is_the_sum_of_single_counts():
+    assert count_tokens_batch(TEXTS) == sum(count_tokens(text) for text in TEXTS)
+
+
+def test_counts_are_estimated_without_the_encoding(monkeypatch):
+    monkeypatch.setattr(tokens, "get_encoding", lambda name: None)
+
+    assert count_tokens("x" * 30) == 11
+    assert count_tokens_batch(["x" * 30, ""]) == 12
+
+
+def test_split_pieces_fit_and_cover_the_text():
+    text = " ".join(f"word{i}" for i in range(400))
+
+    for max_tokens in (1, 7, 50):
+        pieces = split_tokens(text, max_tokens)
+        assert all(count_tokens(piece) <= max_tokens for piece in pieces)
+        assert "".join(pieces).replace(" ", "") == text.replace(" ", "")
+
+
+def test_split_without_the_encoding_fits_the_estimate(monkeypatch):
+    monkeypatch.setattr(tokens, "get_encoding", lambda name: None)
+
+    pieces = split_tokens("abcdefghij" * 10, 5)
+    assert [len(piece) for piece in pieces] == [12] * 8 + [4]
+    assert all(count_tokens(piece) <= 5 for piece in pieces)